@@ -0,0 +1,285 @@
+# ARIMA Search: Parallel (p,d,q)(P,D,Q,m) order search with shared-memory data and AIC-bound pruning
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pmdarima as pm
+from pmdarima.arima import ndiffs, nsdiffs
+from shared_array import attach, shared_array, shared_copy
+
+SearchResult = namedtuple('SearchResult', ['order', 'seasonal_order', 'with_intercept', 'aic', 'model', 'table'])
+SearchResult.__doc__ = """ Best model of an order search (refitted) and one table row per candidate that was
+considered: status 'fitted', 'failed', 'pruned' (bound above the best AIC, never fitted) or
+'speculative' (fitted in parallel ahead of the search path, but not part of it). """
+
+FIT_KWARGS = {'method': 'lbfgs', 'maxiter': 50, 'suppress_warnings': True} # Same fits as pm.auto_arima
+FLOOR_MAXITER = 200
+LONG_AR_LAGS = 20
+
+
+def n_params(order, seasonal_order, constant):
+    """ Estimated parameters: ARMA terms, seasonal terms, the constant and the innovation variance. """
+    return order[0] + order[2] + seasonal_order[0] + seasonal_order[2] + int(constant) + 1
+
+
+def _fit_candidate(candidate, maxiter=None):
+    """ AIC and -2 log-likelihood of one candidate; inf when the fit fails or has near
+    non-invertible roots (the same rule as auto_arima). """
+    order, seasonal_order, constant = candidate
+    kwargs = dict(FIT_KWARGS, maxiter=maxiter or FIT_KWARGS['maxiter'])
+    model = pm.ARIMA(order=order, seasonal_order=seasonal_order, with_intercept=constant, **kwargs)
+    try:
+        model.fit(shared_array())
+    except Exception: # Any fit error marks the candidate as failed rather than aborting the search
+        return np.inf, np.inf
+    deviance = -2 * model.arima_res_.llf
+    # auto_arima's check: with MA terms only the MA roots are tested, otherwise the AR roots
+    if order[2] + seasonal_order[2] > 0:
+        roots = model.maroots()
+    elif order[0] + seasonal_order[0] > 0:
+        roots = model.arroots()
+    else:
+        roots = np.array([])
+    if len(roots) and np.abs(1 / roots).max() > 1 - 1e-2:
+        return np.inf, deviance
+    return model.aic(), deviance
+
+
+def _fit_floor(candidate):
+    return _fit_candidate(candidate, maxiter=FLOOR_MAXITER)[1]
+
+
+def long_ar_deviance(y, d, D=0, m=0, lags=LONG_AR_LAGS):
+    """ -2 log-likelihood of a long autoregression on the differenced series (least squares).
+
+    A conditional least-squares stand-in for the floor when the largest candidate cannot be fitted.
+    A long AR usually overfits every candidate by about `lags` deviance units, but this is not a
+    proven bound, so pruning against it is a heuristic.
+    """
+    x = np.diff(y, n=d) if d else np.asarray(y, dtype=np.float64)
+    for _ in range(D):
+        x = x[m:] - x[:-m]
+    n = len(x)
+    lags = min(lags, n // 4)
+    X = np.column_stack([np.ones(n - lags)] + [x[lags - j:n - j] for j in range(1, lags + 1)])
+    resid = x[lags:] - X @ np.linalg.lstsq(X, x[lags:], rcond=None)[0]
+    return n * (np.log(2 * np.pi * resid @ resid / len(resid)) + 1)
+
+
+class _Search:
+    """ Bookkeeping shared by the stepwise and exhaustive searches. """
+
+    def __init__(self, pool, workers, largest, fallback_floor, slack, prune):
+        self.pool, self.workers = pool, workers
+        self.largest, self.floor_future = largest, None
+        self.fallback_floor, self.slack, self.prune = fallback_floor, slack, prune
+        self.computed = {} # candidate -> AIC, including speculative fits
+        self.visited = {} # candidate -> status, in search order
+        self.best, self.best_aic = None, np.inf
+        self.k = 0
+
+    def floor(self):
+        """ Deviance of the largest candidate; -inf (no pruning) until its fit has finished. """
+        if self.floor_future is None or not self.floor_future.done():
+            return -np.inf
+        floor = self.floor_future.result()
+        return floor if np.isfinite(floor) else self.fallback_floor
+
+    def bound(self, candidate):
+        """ Lower bound on a candidate's AIC: every candidate is nested in the model that gave the floor. """
+        return 2 * n_params(*candidate) + self.floor() - self.slack
+
+    def evaluate(self, candidates):
+        """ Fits, in one parallel wave, the candidates not yet fitted whose bound can still beat the best. """
+        todo = [c for c in dict.fromkeys(candidates) if c not in self.computed and self.bound(c) <= self.best_aic]
+        results = self.pool.map(_fit_candidate, todo)
+        if self.prune and self.floor_future is None and todo and self.computed:
+            # Started with the second wave, so searches that end after one wave never pay for it
+            self.floor_future = self.pool.submit(_fit_floor, self.largest)
+        for candidate, (aic, _) in zip(todo, results):
+            self.computed[candidate] = aic
+
+    def visit(self, candidate):
+        """ Takes a candidate into the search, like one auto_arima fit; True if it improves the best AIC. """
+        if candidate in self.visited:
+            return False
+        self.k += 1
+        if candidate not in self.computed:
+            if self.bound(candidate) > self.best_aic:
+                self.visited[candidate] = 'pruned'
+                return False
+            self.computed[candidate] = self.pool.submit(_fit_candidate, candidate).result()[0]
+        aic = self.computed[candidate]
+        self.visited[candidate] = 'fitted' if np.isfinite(aic) else 'failed'
+        if aic < self.best_aic:
+            self.best, self.best_aic = candidate, aic
+            return True
+        return False
+
+    def first_improvement(self, moves, max_k):
+        """ Visits moves (candidate, new_state) in order until one improves, fitting `workers` ahead.
+
+        Returns the new state, or None. The result and the set of visited models are the same as
+        fitting the moves one at a time.
+        """
+        moves = [(c, state) for c, state in moves if c not in self.visited]
+        for start in range(0, len(moves), self.workers):
+            chunk = moves[start:start + self.workers]
+            self.evaluate([c for c, _ in chunk])
+            for candidate, state in chunk:
+                if self.k >= max_k:
+                    return None
+                if self.visit(candidate):
+                    return state
+        return None
+
+    def table(self):
+        """ One row per candidate; aic_bound is -inf when the floor was not known by the end. """
+        if self.floor_future is not None:
+            self.floor_future.cancel()
+        rows = [(c, status) for c, status in self.visited.items()]
+        rows += [(c, 'speculative') for c in self.computed if c not in self.visited]
+        return pd.DataFrame({
+            'order': [c[0] for c, _ in rows], 'seasonal_order': [c[1] for c, _ in rows],
+            'with_intercept': [c[2] for c, _ in rows], 'aic_bound': [self.bound(c) for c, _ in rows],
+            'aic': [self.computed.get(c, np.nan) for c, _ in rows], 'status': [s for _, s in rows],
+        })
+
+
+def _stepwise(search, d, D, m, start, max_p, max_q, max_P, max_Q, constant, max_k):
+    """ The stepwise algorithm of pm.auto_arima (Hyndman & Khandakar), with each step's neighbours
+    fitted in parallel ahead of the point where the sequential search would reach them. """
+    seasonal = m > 1
+    key = lambda p, q, P, Q, c: ((p, d, q), (P, D, Q, m) if seasonal else (0, 0, 0, 0), c)
+    p, q, P, Q = start
+
+    _p, _P = (1 if max_p > 0 else 0), (1 if seasonal and max_P > 0 else 0)
+    _q, _Q = (1 if max_q > 0 else 0), (1 if seasonal and max_Q > 0 else 0)
+    initial = [key(p, q, P, Q, constant), key(0, 0, 0, 0, constant)]
+    initial += [key(_p, 0, _P, 0, constant)] if max_p > 0 or max_P > 0 else []
+    initial += [key(0, _q, 0, _Q, constant)] if max_q > 0 or max_Q > 0 else []
+    initial += [key(0, 0, 0, 0, False)] if constant else []
+    search.evaluate(initial)
+    search.visit(initial[0])
+    if search.visit(key(0, 0, 0, 0, constant)):
+        p = q = P = Q = 0
+    if (max_p > 0 or max_P > 0) and search.visit(key(_p, 0, _P, 0, constant)):
+        p, P, q, Q = _p, _P, 0, 0
+    if (max_q > 0 or max_Q > 0) and search.visit(key(0, _q, 0, _Q, constant)):
+        p, P, Q, q = 0, 0, _Q, _q
+    if constant and search.visit(key(0, 0, 0, 0, False)):
+        p = q = P = Q = 0
+
+    start_k = 0
+    while start_k < search.k < max_k:
+        start_k = search.k
+        moves = []
+        # Same neighbour order as auto_arima: seasonal terms first, then p/q, then the constant
+        for dP, dQ, ok in [(-1, 0, P > 0), (0, -1, Q > 0), (1, 0, P < max_P), (0, 1, Q < max_Q),
+                           (-1, -1, Q > 0 and P > 0), (-1, 1, Q < max_Q and P > 0),
+                           (1, -1, Q > 0 and P < max_P), (1, 1, Q < max_Q and P < max_P)]:
+            if ok:
+                moves.append((key(p, q, P + dP, Q + dQ, constant), (p, q, P + dP, Q + dQ, constant)))
+        for dp, dq, ok in [(-1, 0, p > 0), (0, -1, q > 0), (1, 0, p < max_p), (0, 1, q < max_q),
+                           (-1, -1, q > 0 and p > 0), (-1, 1, q < max_q and p > 0),
+                           (1, -1, q > 0 and p < max_p), (1, 1, q < max_q and p < max_p)]:
+            if ok:
+                moves.append((key(p + dp, q + dq, P, Q, constant), (p + dp, q + dq, P, Q, constant)))
+        moves.append((key(p, q, P, Q, not constant), (p, q, P, Q, not constant)))
+        state = search.first_improvement(moves, max_k)
+        if state is not None:
+            p, q, P, Q, constant = state
+
+
+def _exhaustive(search, d, D, m, max_p, max_q, max_P, max_Q, max_order, constant):
+    """ Every order with p + q + P + Q <= max_order (as auto_arima with stepwise=False), fewest
+    parameters first, in waves; candidates whose bound exceeds the best AIC are never fitted. """
+    seasonal = m > 1
+    candidates = sorted(
+        [((p, d, q), (P, D, Q, m) if seasonal else (0, 0, 0, 0), constant)
+         for p in range(max_p + 1) for q in range(max_q + 1)
+         for P in range(max_P + 1) for Q in range(max_Q + 1) if p + q + P + Q <= max_order],
+        key=lambda c: (n_params(*c), c))
+    for start in range(0, len(candidates), 2 * search.workers):
+        wave = candidates[start:start + 2 * search.workers]
+        search.evaluate(wave)
+        for candidate in wave:
+            search.visit(candidate)
+
+
+def search_orders(y, start_p=2, d=None, start_q=2, max_p=5, max_d=2, max_q=5, start_P=1, D=None, start_Q=1,
+                  max_P=2, max_D=1, max_Q=2, max_order=5, m=1, seasonal=True, stepwise=True, test='kpss',
+                  seasonal_test='ocsb', with_intercept='auto', max_k=100, prune=False, slack=0.0, max_workers=None):
+    """ ARIMA order search with pm.auto_arima's arguments and result, evaluated in a process pool.
+
+    d and D are chosen with the same unit-root tests as auto_arima. The training data is placed in
+    shared memory once and mapped by every worker. stepwise=True follows auto_arima's stepwise path
+    exactly, fitting each step's neighbours in parallel ahead of the point where the sequential
+    search reaches them; stepwise=False fits the whole grid in parallel waves.
+
+    prune=True skips a candidate when its AIC bound, 2k plus the deviance of the largest model in
+    the search space (which nests every candidate), minus slack, cannot beat the best AIC so far.
+    That is only a true bound if the optimizer found the largest model's global optimum, and when
+    it fails the long-AR deviance used instead is a heuristic; which floor applies also depends on
+    when its fit finishes. Pruned searches are faster but may therefore pick a different model
+    from the full search, so pruning is off by default.
+    """
+    y = np.ascontiguousarray(np.asarray(y, dtype=np.float64))
+    seasonal = seasonal and m > 1
+    if not seasonal:
+        m, D, max_P, max_Q, start_P, start_Q = 0, 0, 0, 0, 0, 0
+    elif D is None:
+        D = nsdiffs(y, m=m, test=seasonal_test, max_D=max_D)
+    if d is None:
+        dx = y[m * D:] - y[:-m * D] if D else y
+        d = ndiffs(dx, test=test, alpha=0.05, max_d=max_d)
+    constant = (d + D) in (0, 1) if with_intercept == 'auto' else bool(with_intercept)
+    if stepwise:
+        start_p, start_q = min(start_p, max_p), min(start_q, max_q)
+        start_P, start_Q = min(start_P, max_P), min(start_Q, max_Q)
+
+    workers = max_workers or os.cpu_count()
+    with shared_copy(y) as initargs, \
+            ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=initargs) as pool:
+        largest = ((max_p, d, max_q), (max_P, D, max_Q, m) if seasonal else (0, 0, 0, 0), True)
+        search = _Search(pool, workers, largest, long_ar_deviance(y, d, D, m), slack, prune)
+        if stepwise:
+            _stepwise(search, d, D, m, (start_p, start_q, start_P, start_Q),
+                      max_p, max_q, max_P, max_Q, constant, max_k)
+        else:
+            _exhaustive(search, d, D, m, max_p, max_q, max_P, max_Q, max_order, constant)
+        table = search.table()
+
+    if search.best is None:
+        raise ValueError("No candidate model could be fitted")
+    order, seasonal_order, constant = search.best
+    model = pm.ARIMA(order=order, seasonal_order=seasonal_order, with_intercept=constant, **FIT_KWARGS).fit(y)
+    return SearchResult(order, seasonal_order, constant, search.best_aic, model, table)
+
+
+if __name__ == "__main__":
+    import time
+    import warnings
+    from price_store import load_prices
+
+    warnings.filterwarnings("ignore")
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    train_ts = ts[:len(ts) - 252]
+
+    # Same settings as the auto_arima call in class2_demos.py
+    settings = dict(start_p=1, start_q=1, test='adf', max_p=3, max_q=3, m=1, d=None, seasonal=False, start_P=0, D=0)
+    start = time.perf_counter()
+    stepwise = pm.auto_arima(train_ts, error_action='ignore', suppress_warnings=True, stepwise=True, **settings)
+    stepwise_time = time.perf_counter() - start
+    print(f"pm.auto_arima stepwise: {stepwise.order} intercept={stepwise.with_intercept} "
+          f"AIC {stepwise.aic():.3f} in {stepwise_time:.1f}s")
+
+    for mode, prune in ((True, False), (False, False), (False, True)):
+        start = time.perf_counter()
+        result = search_orders(train_ts, stepwise=mode, prune=prune, **settings)
+        elapsed = time.perf_counter() - start
+        counts = result.table['status'].value_counts().to_dict()
+        print(f"search_orders stepwise={mode} prune={prune}: {result.order} intercept={result.with_intercept} "
+              f"AIC {result.aic:.3f} in {elapsed:.1f}s on {os.cpu_count()} cores; {counts}")
@@ -0,0 +1,122 @@
+# Batch Fetch: Concurrent multi-ticker download into the price store
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fetch_stock_data import fetch_chart, chart_to_dataframe
+from incremental_fetch import refresh_symbol
+from price_store import write_prices, STORE_DIR
+
+
+class RateLimiter:
+    """ Token bucket shared by all worker threads (rate in requests per second). """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_with_retry(client, symbol, limiter=None, retries=3, backoff=0.5, **chart_kwargs):
+    """ Fetches one chart, retrying failed calls with exponential backoff and jitter. """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fetch_chart(client, symbol, **chart_kwargs)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt * (0.5 + random.random()))
+
+
+def fetch_batch(client, symbols, max_workers=8, rate=10.0, retries=3, backoff=0.5, store_dir=STORE_DIR,
+                incremental=False, **chart_kwargs):
+    """ Fetches many symbols concurrently and writes each one to the price store.
+
+    With incremental=True, stored symbols only request bars newer than their last stored one.
+
+    Returns (rows written per symbol, error message per failed symbol).
+    """
+    limiter = RateLimiter(rate) if rate else None
+
+    def fetch(client, symbol, **kwargs):
+        return fetch_with_retry(client, symbol, limiter, retries, backoff, **kwargs)
+
+    def fetch_one(symbol):
+        if incremental:
+            _, rows = refresh_symbol(client, symbol, store_dir=store_dir, fetch=fetch, **chart_kwargs)
+            return rows
+        stock_data = fetch(client, symbol, **chart_kwargs)
+        df = chart_to_dataframe(stock_data)
+        write_prices(df, symbol, store_dir)
+        return len(df)
+
+    written, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_one, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                written[symbol] = future.result()
+            except Exception as e:
+                failed[symbol] = str(e)
+    return written, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch price history for many tickers into the price store.")
+    parser.add_argument('symbols', nargs='*', help="Ticker symbols to fetch")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=10.0, help="Maximum requests per second (0 disables)")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--range', dest='range_', default="10y")
+    parser.add_argument('--store-dir', default=STORE_DIR)
+    parser.add_argument('--incremental', action='store_true', help="Only fetch bars newer than the stored ones")
+    parser.add_argument('--stub', type=int, default=0, metavar='N',
+                        help="Benchmark N synthetic tickers against a local stub chart server")
+    parser.add_argument('--stub-latency', type=float, default=0.05, help="Simulated API latency in seconds")
+    parser.add_argument('--stub-failure-rate', type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.stub:
+        from chart_stub_server import start_stub_server, HttpApiClient
+        server = start_stub_server(latency=args.stub_latency, failure_rate=args.stub_failure_rate)
+        client = HttpApiClient(f"http://{server.server_address[0]}:{server.server_address[1]}")
+        symbols = args.symbols or [f"T{i:04d}" for i in range(args.stub)]
+    else:
+        sys.path.append('/opt/.manus/.sandbox-runtime')
+        from data_api import ApiClient
+        client = ApiClient()
+        symbols = args.symbols or ["AAPL"]
+
+    start = time.perf_counter()
+    written, failed = fetch_batch(client, symbols, max_workers=args.workers, rate=args.rate,
+                                  retries=args.retries, store_dir=args.store_dir,
+                                  incremental=args.incremental, range_=args.range_)
+    elapsed = time.perf_counter() - start
+
+    print(f"Fetched {len(written)}/{len(symbols)} symbols in {elapsed:.2f}s "
+          f"({len(written) / elapsed:.1f} symbols/s, {sum(written.values())} rows)")
+    for symbol, error in sorted(failed.items()):
+        print(f"Failed {symbol}: {error}")
+    if args.stub:
+        print(f"Stub server handled {server.requests} requests, {server.bytes_sent / 1e6:.1f} MB")
+        server.shutdown()
@@ -0,0 +1,67 @@
+# Benchmark: chart API response decoding, string round trip vs vectorized NumPy path
+
+import argparse
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from chart_stub_server import make_chart_response
+from fetch_stock_data import chart_to_dataframe
+
+
+def legacy_chart_to_dataframe(stock_data):
+    """ The original decoding: per-timestamp strftime, then pd.to_datetime on the strings. """
+    result = stock_data['chart']['result'][0]
+    timestamps = result.get('timestamp', [])
+    indicators = result.get('indicators', {})
+    quote = indicators.get('quote', [{}])[0]
+    adjclose = indicators.get('adjclose', [{}])[0].get('adjclose', [])
+
+    dates = [datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d') for ts in timestamps]
+    df = pd.DataFrame({
+        'Date': dates,
+        'Open': quote.get('open', []),
+        'High': quote.get('high', []),
+        'Low': quote.get('low', []),
+        'Close': quote.get('close', []),
+        'Volume': quote.get('volume', []),
+        'Adj Close': adjclose
+    })
+    df.dropna(subset=['Open', 'High', 'Low', 'Close', 'Adj Close'], inplace=True)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df.set_index('Date', inplace=True)
+    return df
+
+
+def best_time(func, payload, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payload)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chart response decoding paths.")
+    parser.add_argument('--interval', default="1m")
+    parser.add_argument('--range', dest='range_', default="2y")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    payload = make_chart_response("AAPL", interval=args.interval, range_=args.range_)
+    n_bars = len(payload['chart']['result'][0]['timestamp'])
+    print(f"Decoding {n_bars} {args.interval} bars ({args.range_})")
+
+    legacy = best_time(legacy_chart_to_dataframe, payload, args.repeat)
+    vectorized = best_time(chart_to_dataframe, payload, args.repeat)
+    print(f"Legacy (strftime + to_datetime): {legacy * 1e3:9.1f} ms")
+    print(f"Vectorized (datetime64):         {vectorized * 1e3:9.1f} ms")
+    print(f"Speedup: {legacy / vectorized:.1f}x")
+
+    # Daily bars must decode to the same frame as before
+    daily = make_chart_response("AAPL", interval="1d", range_="10y")
+    old, new = legacy_chart_to_dataframe(daily), chart_to_dataframe(daily)
+    assert list(old.columns) == list(new.columns) and (old.index == new.index).all()
+    assert np.allclose(old.values, new.values)
+    print("Daily output matches the legacy decoder.")
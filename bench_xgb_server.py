@@ -0,0 +1,122 @@
+# Benchmark: cold start and open-loop latency of the XGBoost inference server (xgb_server.py)
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from xgb_export import export_model, train_demo_model
+
+
+def wait_until_serving(port, rows, timeout=60.0):
+    """ Polls POST /predict until the server answers; returns the time it took. """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request('POST', '/predict', rows.tobytes(), {'Content-Type': 'application/octet-stream'})
+            if conn.getresponse().status == 200:
+                conn.close()
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.005)
+    raise TimeoutError(f"server on port {port} did not answer within {timeout}s")
+
+
+def open_loop(port, rows, rate, duration, clients):
+    """ Sends requests on a fixed schedule of rate per second for duration seconds.
+
+    Latency runs from each request's scheduled send time, so time spent queued behind a slow
+    response counts (no coordinated omission). Returns (latencies in seconds, errors, elapsed).
+    """
+    total = int(rate * duration)
+    latencies = np.full(total, np.nan)
+    body = rows.tobytes()
+    headers = {'Content-Type': 'application/octet-stream'}
+    lock, next_request, errors = threading.Lock(), [0], [0]
+    start = time.perf_counter() + 0.05
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while True:
+            with lock:
+                i = next_request[0]
+                next_request[0] += 1
+            if i >= total:
+                break
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                conn.request('POST', '/predict', body, headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise OSError(response.status)
+                latencies[i] = time.perf_counter() - scheduled
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies[~np.isnan(latencies)], errors[0], time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start and p99 latency of the XGBoost inference server.")
+    parser.add_argument('--rate', type=float, default=1000, help="Requests per second")
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=32, help="Concurrent keep-alive connections")
+    parser.add_argument('--rows', type=int, default=1, help="Feature rows per request")
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    from price_store import load_prices
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    train_size = len(ts) - 252
+    model, X = train_demo_model(ts, train_size)
+    model_dir = tempfile.mkdtemp()
+    spec = export_model(model, model_dir)
+    test_rows = X.iloc[train_size:].to_numpy(dtype=np.float32)
+    rows = np.ascontiguousarray(test_rows[:args.rows])
+    print(f"Exported {spec['trees']} trees ({spec['model_bytes'] / 1024:.0f} KB) to {model_dir}")
+
+    # Cold start: process launch to the first answered prediction
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xgb_server.py'),
+                               '--model-dir', model_dir, '--port', str(args.port)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        cold = wait_until_serving(args.port, rows)
+        print(f"Cold start: {cold * 1e3:.0f} ms to the first prediction ({server.stdout.readline().strip()})")
+
+        conn = http.client.HTTPConnection("127.0.0.1", args.port)
+        conn.request('POST', '/predict', test_rows.tobytes(), {'Content-Type': 'application/octet-stream'})
+        served = np.frombuffer(conn.getresponse().read(), dtype='<f4')
+        print(f"Served predictions match the in-process model: {np.allclose(served, model.predict(test_rows), rtol=1e-6)}")
+
+        open_loop(args.port, rows, args.rate, 1.0, args.clients) # Warm up connections and threads
+        latencies, errors, elapsed = open_loop(args.port, rows, args.rate, args.duration, args.clients)
+        ms = latencies * 1e3
+        print(f"{len(latencies)} requests of {args.rows} row(s) at {args.rate:.0f}/s target, "
+              f"{len(latencies) / elapsed:.0f}/s achieved on {os.cpu_count()} cores, {errors} errors")
+        print(f"Latency: p50 {np.percentile(ms, 50):.2f} ms, p99 {np.percentile(ms, 99):.2f} ms, "
+              f"p99.9 {np.percentile(ms, 99.9):.2f} ms, max {ms.max():.2f} ms")
+        conn.request('GET', '/health')
+        health = json.loads(conn.getresponse().read())
+        print(f"Server batching: {health['requests_per_batch']:.1f} requests per predict call")
+    finally:
+        server.terminate()
+        server.wait()
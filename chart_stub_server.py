@@ -0,0 +1,153 @@
+# Chart Stub Server: Local stand-in for the YahooFinance/get_stock_chart API (testing and benchmarks)
+
+import json
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+INTERVAL_SECONDS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+RANGE_DAYS = {'1d': 1, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653}
+MARKET_OPEN_SECONDS = 13 * 3600 + 30 * 60 # 09:30 New York, expressed in UTC
+
+
+def _noise(symbol_seed, timestamps):
+    # Counter-based hash noise in [0, 1): the same timestamp always gets the same value
+    x = np.sin(timestamps * 12.9898e-5 + symbol_seed) * 43758.5453
+    return x - np.floor(x)
+
+
+def bar_timestamps(interval, period1, period2):
+    """ Returns the bar timestamps (Unix seconds) of weekday sessions in [period1, period2). """
+    step = INTERVAL_SECONDS[interval]
+    if step >= 86400:
+        first_day = period1 // 86400
+        days = np.arange(first_day, period2 // 86400 + 1, dtype=np.int64)
+        timestamps = days * 86400 + MARKET_OPEN_SECONDS
+    else:
+        # 6.5 hour sessions starting at the open
+        session = np.arange(MARKET_OPEN_SECONDS, MARKET_OPEN_SECONDS + 23400, step, dtype=np.int64)
+        days = np.arange(period1 // 86400, period2 // 86400 + 1, dtype=np.int64)
+        timestamps = (days[:, None] * 86400 + session[None, :]).ravel()
+    # 1970-01-01 was a Thursday, so (day + 3) % 7 gives Monday == 0
+    weekday = ((timestamps // 86400) + 3) % 7
+    keep = (weekday < 5) & (timestamps >= period1) & (timestamps < period2)
+    return timestamps[keep]
+
+
+def make_chart_response(symbol, interval="1d", range_="10y", period1=None, period2=None, adj_factor=1.0, now=None):
+    """ Builds a deterministic synthetic chart payload in the Yahoo Finance response layout. """
+    now = int(now if now is not None else time.time())
+    if period2 is None:
+        period2 = now
+    if period1 is None:
+        period1 = int(period2) - RANGE_DAYS[range_] * 86400
+    timestamps = bar_timestamps(interval, int(period1), int(period2))
+
+    seed = zlib.crc32(symbol.encode()) % 1000
+    years = timestamps / (365.25 * 86400) - 45 # Years since 2015
+    base = 20 + seed / 10
+    close = base * np.exp(0.15 * years + 0.2 * np.sin(years * 2.1 + seed)) * (1 + 0.02 * (_noise(seed, timestamps) - 0.5))
+    open_ = close * (1 + 0.01 * (_noise(seed + 1, timestamps) - 0.5))
+    high = np.maximum(open_, close) * (1 + 0.005 * _noise(seed + 2, timestamps))
+    low = np.minimum(open_, close) * (1 - 0.005 * _noise(seed + 3, timestamps))
+    volume = (5e7 * (1 + _noise(seed + 4, timestamps))).astype(np.int64)
+
+    result = {
+        'meta': {'symbol': symbol, 'dataGranularity': interval, 'currency': 'USD'},
+        'timestamp': timestamps.tolist(),
+        'indicators': {
+            'quote': [{
+                'open': open_.tolist(),
+                'high': high.tolist(),
+                'low': low.tolist(),
+                'close': close.tolist(),
+                'volume': volume.tolist(),
+            }],
+            'adjclose': [{'adjclose': (close * adj_factor).tolist()}],
+        },
+    }
+    return {'chart': {'result': [result], 'error': None}}
+
+
+class StubChartHandler(BaseHTTPRequestHandler):
+    """ Serves GET /YahooFinance/get_stock_chart?symbol=...&interval=...&range=... """
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        if url.path != '/YahooFinance/get_stock_chart':
+            self.send_error(404)
+            return
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        with server.lock:
+            server.requests += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.failure_rate and random.random() < server.failure_rate:
+            self.send_error(503, "Injected failure")
+            return
+
+        payload = make_chart_response(
+            query.get('symbol', 'AAPL'),
+            interval=query.get('interval', '1d'),
+            range_=query.get('range', '10y'),
+            period1=int(query['period1']) if 'period1' in query else None,
+            period2=int(query['period2']) if 'period2' in query else None,
+            adj_factor=server.adj_factor,
+            now=server.now,
+        )
+        body = json.dumps(payload).encode()
+        with server.lock:
+            server.bytes_sent += len(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output readable
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0, adj_factor=1.0, now=None):
+    """ Starts the stub server in a daemon thread; port=0 picks a free port. """
+    server = ThreadingHTTPServer((host, port), StubChartHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.adj_factor = adj_factor
+    server.now = now
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.bytes_sent = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class HttpApiClient:
+    """ Minimal HTTP client with the same call_api interface as data_api.ApiClient. """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def call_api(self, api_name, query=None):
+        url = f"{self.base_url}/{api_name}?{urllib.parse.urlencode(query or {})}"
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    server = start_stub_server(port=8765)
+    print(f"Stub chart API listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
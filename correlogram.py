@@ -0,0 +1,140 @@
+# Correlogram: FFT-based ACF and Durbin-Levinson PACF with caching, for plots and Ljung-Box tests
+
+import hashlib
+from collections import namedtuple, OrderedDict
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+Correlogram = namedtuple('Correlogram', ['acf', 'pacf', 'nobs'])
+Correlogram.__doc__ = """ Autocorrelations and partial autocorrelations for lags 0..nlags of one series. """
+
+CACHE_SIZE = 1024 # Series kept in the in-memory cache
+_cache = OrderedDict()
+
+
+def acf_fft(panel, nlags):
+    """ Sample autocorrelations (biased estimator, demeaned) for every row, via one real FFT per row. """
+    x = np.atleast_2d(np.asarray(panel, dtype=np.float64))
+    x = x - x.mean(axis=1, keepdims=True)
+    T = x.shape[1]
+    nfft = 1 << int(np.ceil(np.log2(2 * T - 1))) # Zero padding avoids circular wrap-around
+    spectrum = np.fft.rfft(x, n=nfft, axis=1)
+    acov = np.fft.irfft(spectrum * np.conj(spectrum), n=nfft, axis=1)[:, :nlags + 1]
+    return acov / acov[:, :1]
+
+
+def pacf_durbin_levinson(acf, nlags):
+    """ Partial autocorrelations from autocorrelations for every row (Yule-Walker, as pacf method='ywm'). """
+    r = np.atleast_2d(acf)
+    n = r.shape[0]
+    pacf = np.zeros((n, nlags + 1))
+    pacf[:, 0] = 1.0
+    phi = np.zeros((n, nlags + 1)) # AR coefficients of the current order, phi[:, 1..k]
+    variance = np.ones(n)
+    for k in range(1, nlags + 1):
+        reflection = (r[:, k] - (phi[:, 1:k] * r[:, k - 1:0:-1]).sum(axis=1)) / variance
+        previous = phi[:, 1:k].copy()
+        phi[:, 1:k] = previous - reflection[:, None] * previous[:, ::-1]
+        phi[:, k] = reflection
+        variance = variance * (1 - reflection ** 2)
+        pacf[:, k] = reflection
+    return pacf
+
+
+def _key(values):
+    return hashlib.sha1(np.ascontiguousarray(values).tobytes()).hexdigest(), len(values)
+
+
+def correlogram_panel(panel, nlags=40):
+    """ Correlograms for every row of a (series x time) panel, computing only rows not already cached.
+
+    A cached result with at least nlags lags is sliced instead of recomputed.
+    """
+    panel = np.atleast_2d(np.asarray(panel, dtype=np.float64))
+    results, missing = [None] * len(panel), []
+    for i, row in enumerate(panel):
+        key = _key(row)
+        cached = _cache.get(key)
+        if cached is not None and len(cached.acf) > nlags:
+            _cache.move_to_end(key)
+            results[i] = Correlogram(cached.acf[:nlags + 1], cached.pacf[:nlags + 1], cached.nobs)
+        else:
+            missing.append(i)
+
+    if missing:
+        acf = acf_fft(panel[missing], nlags)
+        pacf = pacf_durbin_levinson(acf, nlags)
+        for j, i in enumerate(missing):
+            results[i] = Correlogram(acf[j], pacf[j], panel.shape[1])
+            _cache[_key(panel[i])] = results[i]
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return results
+
+
+def correlogram(series, nlags=40):
+    """ Correlogram of one series (missing values dropped, like plot_acf on a clean series). """
+    values = np.asarray(series, dtype=np.float64)
+    return correlogram_panel(values[~np.isnan(values)], nlags)[0]
+
+
+def plot_correlogram(corr, axes, titles=('Autocorrelation', 'Partial Autocorrelation'), alpha=0.05):
+    """ Draws ACF and PACF stems with confidence bands on two axes, in the style of plot_acf/plot_pacf. """
+    z = stats.norm.ppf(1 - alpha / 2)
+    # Bartlett's formula for the ACF band; 1/sqrt(nobs) for the PACF band
+    acf_var = np.ones(len(corr.acf)) / corr.nobs
+    acf_var[0] = 0
+    acf_var[2:] *= 1 + 2 * np.cumsum(corr.acf[1:-1] ** 2)
+    pacf_var = np.ones(len(corr.pacf)) / corr.nobs
+    for ax, values, var, title in zip(axes, (corr.acf, corr.pacf), (acf_var, pacf_var), titles):
+        lags = np.arange(len(values))
+        ax.vlines(lags, [0], values)
+        ax.axhline()
+        ax.margins(0.05)
+        ax.plot(lags, values, marker='o', markersize=5, linestyle='None')
+        ax.set_title(title)
+        ax.set_ylim(-1, 1)
+        band = z * np.sqrt(var[1:])
+        edges = lags[1:].astype(float)
+        edges[0] -= 0.5
+        edges[-1] += 0.5
+        ax.fill_between(edges, -band, band, alpha=0.25)
+
+
+def ljung_box(corr, lags=(20,), model_df=0):
+    """ Ljung-Box test from a cached correlogram; same table as acorr_ljungbox(..., return_df=True). """
+    lags = np.asarray(lags)
+    n = corr.nobs
+    max_lag = lags.max()
+    if max_lag >= len(corr.acf):
+        raise ValueError(f"Correlogram only has {len(corr.acf) - 1} lags; {max_lag} requested")
+    terms = corr.acf[1:max_lag + 1] ** 2 / (n - np.arange(1, max_lag + 1))
+    statistic = n * (n + 2) * np.cumsum(terms)[lags - 1]
+    return pd.DataFrame({'lb_stat': statistic, 'lb_pvalue': stats.chi2.sf(statistic, lags - model_df)}, index=lags)
+
+
+if __name__ == "__main__":
+    import time
+    from statsmodels.tsa.stattools import acf, pacf
+    from statsmodels.stats.diagnostic import acorr_ljungbox
+    from price_store import load_prices
+
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    diff = ts.diff().dropna()
+    for name, series in (('original', ts), ('differenced', diff)):
+        corr = correlogram(series, 40)
+        print(f"{name}: max |ACF diff| {np.abs(corr.acf - acf(series, nlags=40)).max():.1e}, "
+              f"max |PACF diff| {np.abs(corr.pacf - pacf(series, nlags=40, method='ywm')).max():.1e}")
+    print(ljung_box(correlogram(diff, 40), lags=[20]))
+    print(acorr_ljungbox(diff, lags=[20], return_df=True))
+
+    rng = np.random.default_rng(0)
+    panel = rng.standard_normal((2000, 2520)).cumsum(axis=1)
+    start = time.perf_counter()
+    correlogram_panel(panel, 40)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    correlogram_panel(panel, 40)
+    cached = time.perf_counter() - start
+    print(f"2000 series x 40 lags: {first * 1e3:.0f} ms computed, {cached * 1e3:.0f} ms from cache")
@@ -0,0 +1,103 @@
+# Downsample: Min/max per pixel bucket and largest-triangle-three-buckets decimation for long series
+
+import numpy as np
+
+
+def minmax_decimate(x, y, n_buckets):
+    """ Keeps the first, last, minimum and maximum point of each of n_buckets equal buckets.
+
+    A line drawn through these points covers the same pixels as the full line when there is one
+    bucket per pixel column. Buckets that are entirely NaN keep one NaN so gaps stay gaps.
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 4 * n_buckets:
+        return x, y
+    size = -(-n // n_buckets)
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(rows, size)
+    missing = np.isnan(padded)
+    all_missing = missing.all(axis=1)
+    lo = np.argmin(np.where(missing, np.inf, padded), axis=1)
+    hi = np.argmax(np.where(missing, -np.inf, padded), axis=1)
+    # The first and last observed point of each bucket keep the joins between buckets exact
+    first = np.argmax(~missing, axis=1)
+    last = size - 1 - np.argmax(~missing[:, ::-1], axis=1)
+    offsets = np.arange(rows)[:, None] * size
+    keep = (np.stack([first, lo, hi, last], axis=1) + offsets)[~all_missing].ravel()
+    keep = np.concatenate([keep, offsets[all_missing, 0]])
+    keep = np.unique(np.clip(keep, 0, n - 1))
+    return x[keep], y[keep]
+
+
+def envelope_decimate(x, lower, upper, n_buckets):
+    """ Bucket-wise envelope of a shaded band: the lowest lower and highest upper value per bucket. """
+    x = np.asarray(x)
+    lower, upper = np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64)
+    n = len(x)
+    if n <= 4 * n_buckets:
+        return x, lower, upper
+    starts = np.arange(0, n, -(-n // n_buckets))
+    with np.errstate(invalid='ignore'):
+        lows = np.fmin.reduceat(lower, starts)
+        highs = np.fmax.reduceat(upper, starts)
+    keep = np.append(starts, n - 1)
+    return x[keep], np.append(lows, lower[-1]), np.append(highs, upper[-1])
+
+
+def lttb(x, y, n_out):
+    """ Largest-triangle-three-buckets: n_out points chosen to preserve the visual shape of the series.
+
+    Suited to marker plots, where every kept point is drawn; missing values are dropped first.
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    observed = ~np.isnan(y)
+    x, y = x[observed], y[observed]
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+    # Areas need a numeric x axis; dates are measured in their own units
+    t = x.astype('int64').astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        nxt = slice(stop, edges[b + 2]) if b + 2 < len(edges) else slice(n - 1, n)
+        avg_t, avg_y = t[nxt].mean(), y[nxt].mean()
+        area = np.abs((t[previous] - avg_t) * (y[start:stop] - y[previous])
+                      - (t[previous] - t[start:stop]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        keep[b + 1] = previous
+    return x[keep], y[keep]
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from matplotlib.image import imread
+    from render_pipeline import figure_spec, panel, line, render
+
+    # One year of one-minute bars, drawn at the size of plot_01_raw_data
+    rng = np.random.default_rng(0)
+    n = 2_000_000
+    x = np.datetime64('2024-01-01T00:00') + np.arange(n).astype('timedelta64[m]')
+    y = 100 + rng.standard_normal(n).cumsum() * 0.05
+    out = tempfile.mkdtemp()
+    timings, images = {}, {}
+    for decimate in (False, True):
+        spec = figure_spec(f"minute_bars_{decimate}.png", [panel([line(x, y)], title='Minute Bars',
+                           xlabel='Date', ylabel='Price (USD)', grid=True)], decimate=decimate, output_dir=out)
+        start = time.perf_counter()
+        images[decimate] = imread(render(spec))
+        timings[decimate] = time.perf_counter() - start
+    kept = len(figure_spec("probe.png", [panel([line(x, y)])], output_dir=out)['panels'][0]['lines'][0]['y'])
+    changed = np.abs(images[True] - images[False]).max(axis=2) > 0.1
+    print(f"{n} points: {timings[False]:.2f}s full vs {timings[True]:.2f}s decimated to {kept} points; "
+          f"{changed.mean():.3%} of pixels differ")
+
+    xs, ys = lttb(x, y, 1200)
+    print(f"LTTB to {len(ys)} points keeps the range {ys.min():.2f}..{ys.max():.2f} of {y.min():.2f}..{y.max():.2f}")
@@ -0,0 +1,126 @@
+# Feature Builder: Calendar, lag and rolling-mean features for a panel of tickers in one preallocated array
+
+import numpy as np
+
+CALENDAR_FEATURES = ('hour', 'dayofweek', 'quarter', 'month', 'year', 'dayofyear', 'dayofmonth', 'weekofyear')
+LAGS = (1, 5, 10, 21) # 1 day, 1 week, 2 weeks, 1 month (approx)
+WINDOWS = (5, 21) # Rolling means over 1 week, 1 month, of the values before each bar
+FEATURE_NAMES = CALENDAR_FEATURES + tuple(f'lag_{lag}' for lag in LAGS) + tuple(f'rolling_mean_{w}' for w in WINDOWS)
+HISTORY = max(LAGS + WINDOWS) # Observations before a bar that its features depend on
+
+
+def _iso_weeks_in_year(year):
+    """ 52 or 53: a year has 53 ISO weeks when it ends on a Thursday or the year before ends on a Wednesday. """
+    def weekday_of_dec_31(y):
+        return (y + y // 4 - y // 100 + y // 400) % 7 # 0 = Sunday, 3 = Wednesday, 4 = Thursday
+    return 52 + ((weekday_of_dec_31(year) == 4) | (weekday_of_dec_31(year - 1) == 3))
+
+
+def calendar_features(dates):
+    """ (T, 8) calendar columns of CALENDAR_FEATURES, with pandas' .dt semantics and ISO weeks. """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    days = dates.astype('datetime64[D]')
+    years = days.astype('datetime64[Y]')
+    months = days.astype('datetime64[M]')
+    year = years.astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    dayofweek = (days.astype(np.int64) + 3) % 7 # 1970-01-01 was a Thursday; Monday is 0
+    dayofyear = (days - years).astype(np.int64) + 1
+    # ISO week: the week (Monday to Sunday) containing the year's first Thursday is week 1
+    week = (dayofyear - (dayofweek + 1) + 10) // 7
+    week = np.where(week < 1, _iso_weeks_in_year(year - 1), np.where(week > _iso_weeks_in_year(year), 1, week))
+    out = np.empty((len(dates), len(CALENDAR_FEATURES)))
+    out[:, 0] = (dates - days).astype('timedelta64[h]').astype(np.int64)
+    out[:, 1] = dayofweek
+    out[:, 2] = (month - 1) // 3 + 1
+    out[:, 3] = month
+    out[:, 4] = year
+    out[:, 5] = dayofyear
+    out[:, 6] = (days - months).astype(np.int64) + 1
+    out[:, 7] = week
+    return out
+
+
+def build_features(prices, dates, out=None):
+    """ Feature matrix of a (tickers x time) price panel, (tickers, time, FEATURE_NAMES) in float32.
+
+    Row (i, t) holds the same values as class3_demos.create_features for ticker i at dates[t]:
+    calendar columns shared by all tickers, the price lag periods back, and the mean of the window
+    prices before t. Features that reach before the start of the data, or over a missing price,
+    are NaN. All tickers are written at once into out (allocated if None); reshape to
+    (tickers * time, features) for a model.
+    """
+    prices = np.atleast_2d(np.asarray(prices, dtype=np.float64))
+    n, T = prices.shape
+    if out is None:
+        out = np.empty((n, T, len(FEATURE_NAMES)), dtype=np.float32)
+    out[:, :, :len(CALENDAR_FEATURES)] = calendar_features(dates)
+
+    col = len(CALENDAR_FEATURES)
+    for lag in LAGS:
+        out[:, :lag, col] = np.nan
+        out[:, lag:, col] = prices[:, :T - lag]
+        col += 1
+
+    # Window sums of the previous prices, grown one shifted slice at a time: sum_k=1..w price[t - k]
+    total = np.zeros((n, T))
+    total[:, 0] = np.nan
+    k = 0
+    for window in WINDOWS:
+        for k in range(k + 1, window + 1):
+            total[:, k:] += prices[:, :T - k]
+            total[:, k - 1] = np.nan
+        out[:, :, col] = total / window
+        col += 1
+    return out
+
+
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    from price_store import load_prices
+
+    def create_features(df, label=None):
+        """ The original class3_demos.py implementation, kept here as the reference. """
+        df = df.copy()
+        df['date'] = df.index
+        df['hour'] = df['date'].dt.hour
+        df['dayofweek'] = df['date'].dt.dayofweek
+        df['quarter'] = df['date'].dt.quarter
+        df['month'] = df['date'].dt.month
+        df['year'] = df['date'].dt.year
+        df['dayofyear'] = df['date'].dt.dayofyear
+        df['dayofmonth'] = df['date'].dt.day
+        df['weekofyear'] = df['date'].dt.isocalendar().week.astype(int)
+        for lag in LAGS:
+            df[f'lag_{lag}'] = df['Adj Close'].shift(lag)
+        for window in WINDOWS:
+            df[f'rolling_mean_{window}'] = df['Adj Close'].shift(1).rolling(window=window).mean()
+        return df[list(FEATURE_NAMES)]
+
+    # Same values as the DataFrame version on AAPL, and ISO weeks right across 1990-2060
+    df = load_prices("AAPL", columns=['Adj Close'])
+    expected = create_features(df).to_numpy(dtype=np.float32)
+    result = build_features(df['Adj Close'].to_numpy(), df.index)[0]
+    print(f"AAPL: {result.shape}, identical to create_features: {np.array_equal(result, expected, equal_nan=True)}")
+    calendar = pd.DataFrame(index=pd.date_range('1990-01-01', '2060-12-31', freq='D'), data={'Adj Close': 1.0})
+    print(f"Calendar 1990-2060 identical: "
+          f"{np.array_equal(calendar_features(calendar.index), create_features(calendar).iloc[:, :8].to_numpy(dtype=np.float64))}")
+
+    # 1,000 tickers x 10 years of business days
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2015-01-01', periods=2520)
+    prices = 100 * np.exp(rng.normal(0, 0.02, (1000, len(dates))).cumsum(axis=1))
+    prices[:50, :300] = np.nan # Late listings
+    out = np.empty((1000, len(dates), len(FEATURE_NAMES)), dtype=np.float32)
+    start = time.perf_counter()
+    build_features(prices, dates, out)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(20):
+        create_features(pd.DataFrame({'Adj Close': prices[i]}, index=dates))
+    looped = (time.perf_counter() - start) / 20 * len(prices)
+    print(f"1000 tickers x 10 years: {elapsed:.2f}s into a {out.nbytes / 1024 ** 2:.0f} MB float32 array; "
+          f"create_features per ticker ~{looped:.1f}s ({looped / elapsed:.0f}x)")
+    check = create_features(pd.DataFrame({'Adj Close': prices[7]}, index=dates)).to_numpy(dtype=np.float32)
+    print(f"Late-listed ticker identical: {np.array_equal(out[7], check, equal_nan=True)}")
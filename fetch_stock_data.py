@@ -1,75 +1,115 @@
 import sys
-sys.path.append('/opt/.manus/.sandbox-runtime')
-from data_api import ApiClient
+import time
+import numpy as np
 import pandas as pd
-from datetime import datetime
-
-# Initialize API client
-client = ApiClient()
-
-# Define parameters for API call
-symbol = "AAPL"
-interval = "1d"
-range_ = "10y"
-include_adjusted_close = True
-
-# Call the Yahoo Finance API
-try:
-    stock_data = client.call_api(
-        'YahooFinance/get_stock_chart',
-        query={
-            'symbol': symbol,
-            'interval': interval,
-            'range': range_,
-            'includeAdjustedClose': include_adjusted_close
-        }
-    )
+from price_store import write_prices
 
-    # Check if data was retrieved successfully
-    if stock_data and 'chart' in stock_data and 'result' in stock_data['chart'] and stock_data['chart']['result']:
-        result = stock_data['chart']['result'][0]
-        timestamps = result.get('timestamp', [])
-        indicators = result.get('indicators', {})
-        quote = indicators.get('quote', [{}])[0]
-        adjclose = indicators.get('adjclose', [{}])[0].get('adjclose', [])
-
-        if timestamps and quote and adjclose and len(timestamps) == len(quote.get('open', [])):
-            # Convert timestamps to datetime objects
-            dates = [datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d') for ts in timestamps]
-
-            # Create DataFrame
-            df = pd.DataFrame({
-                'Date': dates,
-                'Open': quote.get('open', []), 
-                'High': quote.get('high', []), 
-                'Low': quote.get('low', []), 
-                'Close': quote.get('close', []), 
-                'Volume': quote.get('volume', []), 
-                'Adj Close': adjclose
-            })
-
-            # Remove rows where any price data might be null (often happens at the start)
-            df.dropna(subset=['Open', 'High', 'Low', 'Close', 'Adj Close'], inplace=True)
-            
-            # Set Date as index
-            df['Date'] = pd.to_datetime(df['Date'])
-            df.set_index('Date', inplace=True)
-
-            # Save to CSV
-            output_file = "/home/ubuntu/aapl_stock_data_10y.csv"
-            df.to_csv(output_file)
-            print(f"Successfully fetched and saved data to {output_file}")
-            print(f"Data shape: {df.shape}")
-            print(f"Date range: {df.index.min()} to {df.index.max()}")
-        else:
-            print("Error: Incomplete data received from API.")
-            print(f"Timestamps: {len(timestamps)}, Opens: {len(quote.get('open', []))}, AdjClose: {len(adjclose)}")
 
+def fetch_chart(client, symbol, interval="1d", range_="10y", include_adjusted_close=True, period1=None, period2=None):
+    """ Calls the Yahoo Finance chart API for one symbol.
+
+    If period1 (Unix seconds) is given, bars in [period1, period2) are requested instead of range_.
+    """
+    query = {
+        'symbol': symbol,
+        'interval': interval,
+        'includeAdjustedClose': include_adjusted_close
+    }
+    if period1 is not None:
+        query['period1'] = int(period1)
+        query['period2'] = int(period2 if period2 is not None else time.time())
     else:
-        print("Error: Could not retrieve valid stock data from API.")
-        print(f"API Response: {stock_data}")
+        query['range'] = range_
+    return client.call_api('YahooFinance/get_stock_chart', query=query)
+
+
+# Intervals whose bars are labelled by calendar date only
+DAILY_INTERVALS = ('1d', '5d', '1wk', '1mo', '3mo')
+
+
+def chart_to_dataframe(stock_data, interval=None):
+    """ Converts a chart API response into an OHLCV DataFrame indexed by Date.
+
+    Timestamps and quote arrays are converted with single NumPy calls; daily bars are labelled by
+    date and intraday bars keep their UTC time. interval defaults to the response's dataGranularity.
+    """
+    # Check if data was retrieved successfully
+    if not (stock_data and 'chart' in stock_data and 'result' in stock_data['chart'] and stock_data['chart']['result']):
+        raise ValueError(f"Could not retrieve valid stock data from API. API Response: {stock_data}")
+
+    result = stock_data['chart']['result'][0]
+    timestamps = result.get('timestamp', [])
+    indicators = result.get('indicators', {})
+    quote = indicators.get('quote', [{}])[0]
+    adjclose = indicators.get('adjclose', [{}])[0].get('adjclose', [])
+
+    if not (timestamps and quote and adjclose and len(timestamps) == len(quote.get('open', []))):
+        raise ValueError("Incomplete data received from API. "
+                         f"Timestamps: {len(timestamps)}, Opens: {len(quote.get('open', []))}, AdjClose: {len(adjclose)}")
+
+    if interval is None:
+        interval = result.get('meta', {}).get('dataGranularity', '1d')
+
+    # Convert Unix seconds straight to datetime64 (missing values in the JSON arrays become NaN)
+    dates = np.asarray(timestamps, dtype=np.int64).astype('datetime64[s]')
+    if interval in DAILY_INTERVALS:
+        dates = dates.astype('datetime64[D]')
+    prices = {
+        'Open': np.asarray(quote.get('open', []), dtype=np.float64),
+        'High': np.asarray(quote.get('high', []), dtype=np.float64),
+        'Low': np.asarray(quote.get('low', []), dtype=np.float64),
+        'Close': np.asarray(quote.get('close', []), dtype=np.float64),
+    }
+    volume = np.asarray(quote.get('volume', []), dtype=np.float64)
+    adj_close = np.asarray(adjclose, dtype=np.float64)
+
+    # Remove rows where any price data might be null (often happens at the start)
+    keep = ~np.isnan(adj_close)
+    for values in prices.values():
+        keep &= ~np.isnan(values)
+    if not keep.all():
+        dates, volume, adj_close = dates[keep], volume[keep], adj_close[keep]
+        prices = {name: values[keep] for name, values in prices.items()}
+    if not np.isnan(volume).any():
+        volume = volume.astype(np.int64)
+
+    # Create DataFrame with Date as index
+    df = pd.DataFrame(prices, index=pd.DatetimeIndex(dates.astype('datetime64[ns]'), name='Date'))
+    df['Volume'] = volume
+    df['Adj Close'] = adj_close
+    return df
+
+
+if __name__ == "__main__":
+    sys.path.append('/opt/.manus/.sandbox-runtime')
+    from data_api import ApiClient
+
+    # Initialize API client
+    client = ApiClient()
+
+    # Define parameters for API call
+    symbol = "AAPL"
+    interval = "1d"
+    range_ = "10y"
+    include_adjusted_close = True
+
+    # Call the Yahoo Finance API
+    try:
+        stock_data = fetch_chart(client, symbol, interval, range_, include_adjusted_close)
+        df = chart_to_dataframe(stock_data)
 
-except Exception as e:
-    print(f"An error occurred: {e}")
+        # Save to CSV
+        output_file = "/home/ubuntu/aapl_stock_data_10y.csv"
+        df.to_csv(output_file)
+        print(f"Successfully fetched and saved data to {output_file}")
 
+        # Save to the columnar store read by the class demos
+        store_path = write_prices(df, symbol)
+        print(f"Successfully saved data to store {store_path}")
+        print(f"Data shape: {df.shape}")
+        print(f"Date range: {df.index.min()} to {df.index.max()}")
 
+    except ValueError as e:
+        print(f"Error: {e}")
+    except Exception as e:
+        print(f"An error occurred: {e}")
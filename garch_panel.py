@@ -0,0 +1,285 @@
+# GARCH Panel: Vectorized GARCH(1,1) maximum likelihood for many return series at once
+
+from collections import namedtuple
+import numpy as np
+
+PARAM_NAMES = ('mu', 'omega', 'alpha[1]', 'beta[1]')
+
+GarchPanelResult = namedtuple('GarchPanelResult', ['params', 'loglikelihood', 'conditional_volatility',
+                                                   'next_variance', 'converged', 'iterations'])
+GarchPanelResult.__doc__ = """ Per-series results: params (n, 4) in PARAM_NAMES order and the units of
+the returns, loglikelihood (n,), conditional_volatility (n, T), next_variance (n,) (one-step-ahead
+variance forecast after the last return), converged (n,) and iterations (n,). """
+
+MAX_PERSISTENCE = 1 - 1e-6
+LOWER = np.array([-1.0, 1e-8, 0.0, 0.0]) # Bounds on (mu, omega, persistence, alpha share) in standardized units
+UPPER = np.array([1.0, 10.0, MAX_PERSISTENCE, 1.0])
+STEPS = 8 # Shorter step lengths 1/2, ..., 1/256 tried together when the full step fails
+
+
+def backcast(resids):
+    """ Starting variance per series as in arch: exponentially weighted mean of the first 75 squared residuals. """
+    out = np.empty(len(resids))
+    for i, e in enumerate(resids):
+        e = e[~np.isnan(e)]
+        tau = min(75, len(e))
+        w = 0.94 ** np.arange(tau)
+        out[i] = (e[:tau] ** 2) @ (w / w.sum())
+    return out
+
+
+def _to_natural(theta):
+    """ (mu, omega, persistence, alpha share) -> (mu, omega, alpha, beta). """
+    mu, omega, persistence, share = theta
+    return mu, omega, persistence * share, persistence * (1 - share)
+
+
+def _variance(returns, mu, omega, alpha, beta, init, first, observed):
+    """ Conditional variance recursion run for all series in step over a (time x series) panel.
+
+    Returns (sigma2 (T, n), next variance (n,)).
+    """
+    T, n = returns.shape
+    sigma2 = np.empty((T, n))
+    start = omega + (alpha + beta) * init
+    current = start
+    started, complete = first.max(), observed.all(axis=1)
+    for t in range(T):
+        # Before a series' first return its recursion has not started; a missing return adds its expectation
+        if t <= started:
+            current = np.where(t <= first, start, current)
+        sigma2[t] = current
+        e2 = (returns[t] - mu) ** 2
+        if not complete[t]:
+            e2 = np.where(observed[t], e2, current)
+        current = omega + alpha * e2 + beta * current
+    return sigma2, current
+
+
+def _nll(theta, returns, init, first, observed):
+    """ Negative log-likelihood per series (without the constant). """
+    mu = theta[0]
+    sigma2, _ = _variance(returns, *_to_natural(theta), init, first, observed)
+    terms = np.log(sigma2) + (returns - mu) ** 2 / sigma2
+    return 0.5 * np.where(observed, terms, 0.0).sum(axis=0)
+
+
+def _scores(theta, returns, init, first, observed):
+    """ Negative log-likelihood, its gradient (4, n) and the outer product of per-return scores (n, 4, 4).
+
+    Derivatives of sigma2 with respect to (mu, omega, alpha, beta) are carried forward with the
+    recursion, then mapped to (mu, omega, persistence, share).
+    """
+    T, n = returns.shape
+    mu, omega, persistence, share = theta
+    _, _, alpha, beta = _to_natural(theta)
+    zeros = np.zeros(n)
+    start, d_start = omega + (alpha + beta) * init, np.stack([zeros, np.ones(n), init, init])
+    current, d_current = start, d_start
+    nll, grad, outer, product = np.zeros(n), np.zeros((4, n)), np.zeros((4, 4, n)), np.empty((4, 4, n))
+    started, complete = first.max(), observed.all(axis=1)
+    for t in range(T):
+        if t <= started:
+            before = t <= first
+            current = np.where(before, start, current)
+            d_current = np.where(before, d_start, d_current)
+        e = returns[t] - mu
+        if complete[t]:
+            e2 = e * e
+            d_e2 = np.zeros((4, n))
+            d_e2[0] = -2 * e
+            score = (0.5 * (current - e2) / current ** 2) * d_current
+            nll += np.log(current) + e2 / current
+        else:
+            obs = observed[t]
+            e = np.where(obs, e, 0.0)
+            e2 = np.where(obs, e * e, current)
+            # For a missing return e2 = s2, so its derivative follows d s2
+            d_e2 = np.where(obs, np.stack([-2 * e, zeros, zeros, zeros]), d_current)
+            score = np.where(obs, 0.5 * (current - e2) / current ** 2, 0.0) * d_current
+            nll += np.where(obs, np.log(current) + e2 / current, 0.0)
+        # d/dtheta of (log s2 + e2 / s2) / 2 = (s2 - e2) / (2 s2^2) d s2 - e / s2 d mu
+        score[0] -= e / current
+        grad += score
+        np.multiply(score[:, None], score[None, :], out=product)
+        outer += product
+        d_next = alpha * d_e2 + beta * d_current
+        d_next[1] += 1
+        d_next[2] += e2
+        d_next[3] += current
+        current, d_current = omega + alpha * e2 + beta * current, d_next
+    # Chain rule: alpha = persistence * share, beta = persistence * (1 - share)
+    jacobian = np.zeros((n, 4, 4))
+    jacobian[:, 0, 0] = jacobian[:, 1, 1] = 1
+    jacobian[:, 2, 2], jacobian[:, 2, 3] = share, 1 - share
+    jacobian[:, 3, 2], jacobian[:, 3, 3] = persistence, -persistence
+    grad = np.einsum('nij,jn->in', jacobian, grad)
+    outer = jacobian @ outer.transpose(2, 0, 1) @ jacobian.transpose(0, 2, 1)
+    return 0.5 * nll, grad, outer
+
+
+def _starting_values(returns, init, first, observed):
+    """ arch's grid of (alpha, persistence) pairs with variance targeting, best per series. """
+    mu = np.nanmean(returns, axis=0)
+    target = np.nanmean((returns - mu) ** 2, axis=0)
+    best, best_nll = None, np.full(returns.shape[1], np.inf)
+    for alpha in (0.01, 0.05, 0.1, 0.2):
+        for persistence in (0.5, 0.7, 0.9, 0.98):
+            theta = np.stack([mu, (1 - persistence) * target, np.full_like(mu, persistence),
+                              np.full_like(mu, alpha / persistence)])
+            nll = _nll(theta, returns, init, first, observed)
+            better = nll < best_nll
+            best = theta if best is None else np.where(better, theta, best)
+            best_nll = np.where(better, nll, best_nll)
+    return best
+
+
+def fit_garch_panel(returns, start_params=None, maxiter=100, gtol=1e-6, ftol=1e-10):
+    """ Fits GARCH(1,1) with a constant mean and normal errors to each row of a (series x time) return panel.
+
+    Same likelihood as arch_model(returns, vol='Garch', p=1, q=1) (arch's backcast start). Each series
+    takes its own quasi-Newton steps (BHHH curvature from the outer product of scores, refined by
+    BFGS updates, with per-series step halving), but the likelihood recursion and its analytic
+    derivatives run for all unconverged series in step. alpha and beta are estimated as persistence alpha + beta and
+    alpha's share of it, so stationarity is a box bound. Leading NaNs (late listings) are skipped
+    and interior NaNs treated as missing. start_params, e.g. yesterday's result.params, warm-starts
+    the fit in place of arch's starting grid.
+    """
+    returns = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    n, T = returns.shape
+    observed = ~np.isnan(returns)
+    counts = observed.sum(axis=1)
+    if (counts < 10).any():
+        raise ValueError("every series needs at least 10 returns")
+    first = np.argmax(observed, axis=1)
+    # Work in units of each series' standard deviation so all parameters share one scale
+    scale = np.nanstd(returns, axis=1)
+    scale[scale == 0] = 1.0
+    scaled = returns / scale[:, None]
+    init = backcast(scaled - np.nanmean(scaled, axis=1)[:, None])
+    # The recursions step through time, so they read (time x series) arrays
+    scaled, observed_t = np.ascontiguousarray(scaled.T), np.ascontiguousarray(observed.T)
+
+    if start_params is None:
+        theta = _starting_values(scaled, init, first, observed_t)
+    else:
+        mu, omega, alpha, beta = np.asarray(start_params, dtype=np.float64).reshape(n, 4).T
+        persistence = np.clip(alpha + beta, 1e-4, MAX_PERSISTENCE)
+        theta = np.stack([mu / scale, omega / scale ** 2, persistence, alpha / persistence])
+    theta = np.clip(theta, LOWER[:, None], UPPER[:, None])
+
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+    active = np.arange(n)
+    halvings = 0.5 ** np.arange(1, STEPS + 1)
+    # Curvature per series: the outer product of scores (BHHH) to start, refined by BFGS updates
+    curvature, previous_x, previous_grad = np.zeros((n, 4, 4)), np.zeros((4, n)), np.zeros((4, n))
+    for i in range(maxiter):
+        rows = (scaled[:, active], init[active], first[active], observed_t[:, active])
+        x = theta[:, active]
+        nll, grad, outer = _scores(x, *rows)
+        step, change = x - previous_x[:, active], grad - previous_grad[:, active]
+        hessian = curvature[active]
+        hs = np.einsum('nij,jn->ni', hessian, step)
+        sy, shs = (step * change).sum(axis=0), (step.T * hs).sum(axis=1)
+        update = (sy > 1e-12 * np.abs(step).sum(axis=0)) & (shs > 0) & (i > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bfgs = (hessian + np.einsum('in,jn->nij', change, change) / sy[:, None, None]
+                    - hs[:, :, None] * hs[:, None, :] / shs[:, None, None])
+        hessian = np.where(update[:, None, None], bfgs, outer)
+        curvature[active], previous_x[:, active], previous_grad[:, active] = hessian, x, grad
+        # Components held at a bound by the gradient are fixed for this step
+        fixed = ((x <= LOWER[:, None]) & (grad > 0)) | ((x >= UPPER[:, None]) & (grad < 0))
+        grad = np.where(fixed, 0.0, grad)
+        done = np.abs(grad).max(axis=0) / counts[active] < gtol
+        hessian = np.where(fixed.T[:, :, None] | fixed.T[:, None, :], 0.0, hessian)
+        ridge = fixed.T[:, :, None] + 1e-10 * np.trace(hessian, axis1=1, axis2=2)[:, None, None]
+        direction = np.linalg.solve(hessian + np.eye(4) * ridge, -grad.T[:, :, None])[:, :, 0].T
+
+        # Backtracking per series (Armijo): the full step first, then all shorter ones in one pass
+        slope = (grad * direction).sum(axis=0)
+        new_x = np.clip(x + direction, LOWER[:, None], UPPER[:, None])
+        new_nll = _nll(new_x, *rows)
+        moved = (new_nll <= nll + 1e-4 * slope) & ~done
+        retry = np.flatnonzero(~moved & ~done)
+        if len(retry):
+            k = len(retry)
+            trials = np.clip(np.repeat(x[:, retry], STEPS, axis=1) + np.repeat(direction[:, retry], STEPS, axis=1)
+                             * np.tile(halvings, k), LOWER[:, None], UPPER[:, None])
+            trial_nll = _nll(trials, *(np.repeat(r[..., retry], STEPS, axis=-1) for r in rows)).reshape(k, STEPS)
+            ok = trial_nll <= nll[retry, None] + 1e-4 * halvings * slope[retry, None]
+            choice = np.argmax(ok, axis=1)
+            new_x[:, retry] = trials.reshape(4, k, STEPS)[:, np.arange(k), choice]
+            new_nll[retry] = trial_nll[np.arange(k), choice]
+            moved[retry] = ok.any(axis=1)
+        new_x, new_nll = np.where(moved, new_x, x), np.where(moved, new_nll, nll)
+        # No acceptable step, or a negligible change in the likelihood, also ends a series' iterations
+        stalled = ~moved | (np.abs(nll - new_nll) <= ftol * np.maximum(1.0, np.abs(nll)))
+        theta[:, active] = new_x
+        iterations[active[~done]] += 1
+        converged[active[done | (stalled & moved)]] = True
+        active = active[~(done | stalled)]
+        if not len(active):
+            break
+
+    mu, omega, alpha, beta = _to_natural(theta)
+    sigma2, next_variance = _variance(scaled, mu, omega, alpha, beta, init, first, observed_t)
+    nll = _nll(theta, scaled, init, first, observed_t)
+    sigma2 = np.where(np.arange(T) < first[:, None], np.nan, sigma2.T)
+    params = np.stack([mu * scale, omega * scale ** 2, alpha, beta], axis=1)
+    loglikelihood = -(nll + 0.5 * counts * np.log(2 * np.pi) + counts * np.log(scale))
+    return GarchPanelResult(params, loglikelihood, np.sqrt(sigma2) * scale[:, None], next_variance * scale ** 2,
+                            converged, iterations)
+
+
+if __name__ == "__main__":
+    import time
+    import warnings
+    import pandas as pd
+    from arch import arch_model
+    from price_store import load_prices
+
+    warnings.filterwarnings("ignore")
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    log_returns = np.log(ts / ts.shift(1)).dropna().to_numpy()
+    train = log_returns[:len(log_returns) - 252]
+
+    # The class2_demos.py fit. arch is given percent returns, where its optimizer is well scaled
+    result = fit_garch_panel(train)
+    reference = arch_model(train * 100, vol='Garch', p=1, q=1, rescale=False).fit(disp='off')
+    expected = reference.params.to_numpy() / [100, 100 ** 2, 1, 1]
+    print(pd.DataFrame({'panel': result.params[0], 'arch': expected}, index=PARAM_NAMES))
+    print(f"loglik {result.loglikelihood[0]:.4f} vs arch {reference.loglikelihood + len(train) * np.log(100):.4f}; "
+          f"conditional volatility max rel diff "
+          f"{np.max(np.abs(result.conditional_volatility[0] * 100 / reference.conditional_volatility - 1)):.2e}")
+
+    # A universe: simulated GARCH(1,1) series around AAPL's parameters, some listed late
+    rng = np.random.default_rng(0)
+    n, T = 500, len(train)
+    mu, omega = 5e-4, rng.uniform(2e-6, 2e-5, n)
+    alpha = rng.uniform(0.03, 0.15, n)
+    beta = rng.uniform(0.75, 0.95, n).clip(max=0.995 - alpha)
+    panel, variance = np.empty((n, T)), omega / (1 - alpha - beta)
+    for t in range(T):
+        e = np.sqrt(variance) * rng.standard_normal(n)
+        panel[:, t] = mu + e
+        variance = omega + alpha * e ** 2 + beta * variance
+    panel[:20, :500] = np.nan
+
+    start = time.perf_counter()
+    universe = fit_garch_panel(panel)
+    cold = time.perf_counter() - start
+    print(f"{n} series x {T} returns: {cold:.1f}s cold, median {np.median(universe.iterations):.0f} iterations, "
+          f"{universe.converged.sum()} converged")
+    start = time.perf_counter()
+    checks = {i: arch_model(panel[i][~np.isnan(panel[i])] * 100, vol='Garch', p=1, q=1, rescale=False).fit(disp='off')
+              for i in range(0, n, 50)}
+    print(f"arch one series at a time: ~{(time.perf_counter() - start) / len(checks) * n:.1f}s")
+    gaps = [universe.loglikelihood[i] - (fit.loglikelihood + fit.nobs * np.log(100)) for i, fit in checks.items()]
+    print(f"loglik vs arch on every 50th series (panel - arch): min {min(gaps):.2e}, max {max(gaps):.2e}")
+
+    # Next day: one more return per series, warm-started from today's parameters
+    tomorrow = np.concatenate([panel, (mu + np.sqrt(universe.next_variance) * rng.standard_normal(n))[:, None]], axis=1)
+    start = time.perf_counter()
+    warm = fit_garch_panel(tomorrow, start_params=universe.params)
+    print(f"Warm start with one new return: {time.perf_counter() - start:.1f}s, median {np.median(warm.iterations):.0f} iterations")
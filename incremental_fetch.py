@@ -0,0 +1,45 @@
+# Incremental Fetch: Append-only refresh of stored price history
+
+import time
+import numpy as np
+import pandas as pd
+from fetch_stock_data import fetch_chart, chart_to_dataframe
+from price_store import write_prices, append_prices, load_prices, last_timestamp, STORE_DIR
+
+OVERLAP_DAYS = 7 # Calendar days re-requested before the last stored bar to validate 'Adj Close'
+ADJ_CLOSE_RTOL = 1e-6 # Relative change in overlapping 'Adj Close' treated as a corporate action
+
+
+def refresh_symbol(client, symbol, interval="1d", range_="10y", overlap_days=OVERLAP_DAYS,
+                   rtol=ADJ_CLOSE_RTOL, store_dir=STORE_DIR, fetch=fetch_chart):
+    """ Brings the stored history of a symbol up to date.
+
+    Only the window since the last stored bar (plus an overlap) is requested. If the overlapping
+    'Adj Close' values no longer match the stored ones (split or dividend restatement), or the
+    overlap is missing, the full range is fetched again and the stored history is replaced. The
+    last stored bar is left out of that check and rewritten from the new fetch, since it may have
+    been a partial bar fetched mid-session.
+
+    Returns (mode, rows written) where mode is 'full', 'appended' or 'restated'.
+    """
+    last = last_timestamp(symbol, store_dir)
+    if last is None:
+        df = chart_to_dataframe(fetch(client, symbol, interval=interval, range_=range_))
+        write_prices(df, symbol, store_dir)
+        return 'full', len(df)
+
+    period1 = (last - pd.Timedelta(days=overlap_days)).timestamp()
+    new = chart_to_dataframe(fetch(client, symbol, interval=interval, period1=period1, period2=time.time()))
+
+    stored = load_prices(symbol, columns=['Adj Close'], start=new.index.min(), store_dir=store_dir)
+    overlap = new.index.intersection(stored.index[stored.index < last])
+    if len(overlap) == 0 or not np.allclose(new.loc[overlap, 'Adj Close'], stored.loc[overlap, 'Adj Close'],
+                                            rtol=rtol, atol=0):
+        df = chart_to_dataframe(fetch(client, symbol, interval=interval, range_=range_))
+        write_prices(df, symbol, store_dir)
+        return 'restated', len(df)
+
+    fresh = new[new.index >= last]
+    if len(fresh):
+        append_prices(fresh, symbol, store_dir)
+    return 'appended', len(fresh)
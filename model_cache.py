@@ -0,0 +1,135 @@
+# Model Cache: Content-addressed on-disk cache for fitted models and their forecasts
+
+import hashlib
+import json
+import os
+import pickle
+import platform
+import tempfile
+import time
+from importlib.metadata import version, PackageNotFoundError
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = "/home/ubuntu/model_cache"
+MAX_BYTES = 512 * 1024 ** 2 # Least recently used entries are evicted above this total size
+STALE_SECONDS = 3600 # Temporaries older than this are left over from interrupted writes
+BASE_LIBRARIES = ('numpy', 'pandas')
+
+
+def data_hash(data):
+    """ SHA-256 over the values and index of each array / Series / DataFrame in data. """
+    digest = hashlib.sha256()
+    for item in data:
+        if isinstance(item, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(item, index=True).to_numpy().tobytes())
+        else:
+            values = np.ascontiguousarray(item)
+            digest.update(str((values.dtype, values.shape)).encode())
+            digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def library_versions(libraries=()):
+    """ Installed versions of the libraries a fit depends on (plus numpy, pandas and Python). """
+    versions = {'python': platform.python_version()}
+    for name in sorted(set(BASE_LIBRARIES) | set(libraries)):
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def cache_key(data, spec, libraries=()):
+    """ Key of a fit: the data it saw, its model specification and the library versions. """
+    payload = {'data': data_hash(data), 'spec': spec, 'versions': library_versions(libraries)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    """ Deletes least recently used entries until the cache fits in max_bytes, and stale temporaries. """
+    entries = []
+    now = time.time()
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.tmp'):
+            try:
+                if now - entry.stat().st_mtime > STALE_SECONDS:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass # Renamed into place or removed by another process meanwhile
+        elif entry.name.endswith('.pkl'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue # Evicted by another process meanwhile
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass # Evicted by another process meanwhile
+        total -= size
+
+
+def cached_fit(fit, data, spec, libraries=(), cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+    """ Returns (fit(), False) on a miss, storing the result, or (stored result, True) on a hit.
+
+    fit takes no arguments and returns anything picklable, e.g. a fitted model and its forecast.
+    data lists every array the fit reads and spec every setting it uses (a JSON-able dict), so a
+    change to either, or to the versions of the given libraries, is a miss.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, cache_key(data, spec, libraries) + '.pkl')
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(path) # Mark as recently used
+            return result, True
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass # Unreadable entry: refit and overwrite it
+
+    result = fit()
+    # Write to a temporary file first so a concurrent reader never sees a partial entry
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    evict(cache_dir, max_bytes)
+    return result, False
+
+
+if __name__ == "__main__":
+    import warnings
+    from statsmodels.tsa.arima.model import ARIMA
+    from price_store import load_prices
+
+    warnings.filterwarnings("ignore")
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    train_ts = ts[:-252]
+    cache_dir = tempfile.mkdtemp()
+
+    def fit_arima(y):
+        fit = ARIMA(y, order=(1, 1, 1)).fit()
+        return fit, fit.forecast(252)
+
+    spec = {'model': 'ARIMA', 'order': (1, 1, 1), 'steps': 252}
+    for attempt in ('first run', 'rerun'):
+        start = time.perf_counter()
+        (fit, forecast), hit = cached_fit(lambda: fit_arima(train_ts), [train_ts], spec,
+                                          libraries=['statsmodels'], cache_dir=cache_dir)
+        print(f"{attempt}: {'hit' if hit else 'miss'} in {(time.perf_counter() - start) * 1e3:.0f} ms, "
+              f"params {np.round(fit.params.to_numpy(), 4)}")
+
+    # A different training window is a different key; the key always lists the data the fit reads
+    longer_ts = ts[:-251]
+    _, hit = cached_fit(lambda: fit_arima(longer_ts), [longer_ts], spec, libraries=['statsmodels'], cache_dir=cache_dir)
+    print(f"changed data: {'hit' if hit else 'miss'}")
@@ -0,0 +1,114 @@
+# Online GARCH: Per-return conditional volatility updates for many tickers under fixed GARCH(1,1) parameters
+
+import numpy as np
+
+
+class OnlineGarch:
+    """ Next-return conditional variance of n tickers, advanced in O(1) per incoming log return.
+
+    Holds mu, omega, alpha, beta and the current variance forecast per ticker, in the units of the
+    returns passed to update. A missing return (NaN) rolls the variance forward by its expectation,
+    as fit_garch_panel does for gaps.
+    """
+
+    def __init__(self, params, variance, names=None):
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        self.mu, self.omega, self.alpha, self.beta = (np.ascontiguousarray(column) for column in params.T)
+        self.variance = np.array(variance, dtype=np.float64).reshape(len(params))
+        self.names = list(names) if names is not None else list(range(len(params)))
+        self.rows = {name: row for row, name in enumerate(self.names)}
+
+    @classmethod
+    def from_result(cls, result, names=None):
+        """ Starts from a fit_garch_panel result (see garch_panel.py). """
+        return cls(result.params, result.next_variance, names)
+
+    @classmethod
+    def from_arch(cls, fits, names=None, scale=1.0):
+        """ Starts from arch GARCH(1,1) results fitted on returns multiplied by scale. """
+        params, variance = [], []
+        for fit in fits:
+            mu, omega, alpha, beta = fit.params[['mu', 'omega', 'alpha[1]', 'beta[1]']]
+            resid, sigma = np.asarray(fit.resid)[-1], np.asarray(fit.conditional_volatility)[-1]
+            params.append((mu / scale, omega / scale ** 2, alpha, beta))
+            variance.append((omega + alpha * resid ** 2 + beta * sigma ** 2) / scale ** 2)
+        return cls(params, variance, names)
+
+    def update(self, returns):
+        """ Consumes one log return per ticker (NaN where none arrived); returns next-return volatility (n,). """
+        returns = np.asarray(returns, dtype=np.float64)
+        e2 = (returns - self.mu) ** 2
+        missing = np.isnan(returns)
+        if missing.any():
+            e2[missing] = self.variance[missing]
+        self.variance = self.omega + self.alpha * e2 + self.beta * self.variance
+        return np.sqrt(self.variance)
+
+    def update_one(self, name, log_return):
+        """ Consumes one ticker's log return (NaN if none arrived, as in update); returns its next-return volatility. """
+        row = self.rows[name]
+        # Plain floats via item() avoid numpy scalar overhead on this path
+        previous = self.variance.item(row)
+        resid = log_return - self.mu.item(row)
+        e2 = previous if resid != resid else resid * resid # NaN: expected squared residual, like update()
+        variance = self.omega.item(row) + self.alpha.item(row) * e2 + self.beta.item(row) * previous
+        self.variance[row] = variance
+        return variance ** 0.5
+
+    def volatility(self):
+        """ Current next-return volatility (n,). """
+        return np.sqrt(self.variance)
+
+    def forecast(self, steps):
+        """ Volatility forecasts 1..steps returns ahead (n, steps), decaying to the unconditional level. """
+        persistence = self.alpha + self.beta
+        with np.errstate(divide='ignore', invalid='ignore'):
+            long_run = np.where(persistence < 1, self.omega / (1 - persistence), np.inf)
+        decay = persistence[:, None] ** np.arange(steps)
+        # Integrated series (alpha + beta = 1) grow by omega per step instead
+        path = np.where(persistence[:, None] < 1,
+                        long_run[:, None] + decay * (self.variance - long_run)[:, None],
+                        self.variance[:, None] + self.omega[:, None] * np.arange(steps))
+        return np.sqrt(path)
+
+
+if __name__ == "__main__":
+    import time
+    import warnings
+    from arch import arch_model
+    from garch_panel import fit_garch_panel
+    from price_store import load_prices
+
+    warnings.filterwarnings("ignore")
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    log_returns = np.log(ts / ts.shift(1)).dropna().to_numpy()
+    train_size = len(log_returns) - 252
+
+    # Fit on the training returns as in class2_demos.py, then stream the test year return by return
+    fit = arch_model(log_returns[:train_size] * 100, vol='Garch', p=1, q=1, rescale=False).fit(disp='off')
+    online = OnlineGarch.from_arch([fit], names=['AAPL'], scale=100)
+    streamed = [online.update_one('AAPL', r) for r in log_returns[train_size:-1]]
+    reference = arch_model(log_returns * 100, vol='Garch', p=1, q=1, rescale=False).fix(fit.params)
+    expected = np.asarray(reference.conditional_volatility)[train_size + 1:] / 100
+    print(f"Streamed volatility over {len(streamed)} returns: max rel diff vs arch "
+          f"{np.max(np.abs(np.array(streamed) / expected - 1)):.2e}")
+
+    # A universe of tickers fitted together, then fed one return per ticker per tick or one event at a time
+    rng = np.random.default_rng(0)
+    n = 500
+    panel = log_returns[:train_size] * np.exp(rng.normal(0, 0.2, (n, 1))) + rng.normal(0, 0.003, (n, train_size))
+    online = OnlineGarch.from_result(fit_garch_panel(panel), names=[f"T{i:03d}" for i in range(n)])
+    ticks = rng.normal(0, 0.015, (1000, n))
+    start = time.perf_counter()
+    for tick in ticks:
+        online.update(tick)
+    print(f"update: {(time.perf_counter() - start) / len(ticks) * 1e6:.1f} us per tick of {n} tickers")
+
+    events = [(online.names[i], r) for i, r in zip(rng.integers(0, n, 100_000), rng.normal(0, 0.015, 100_000))]
+    timings = np.empty(len(events))
+    for k, (name, r) in enumerate(events):
+        start = time.perf_counter()
+        online.update_one(name, r)
+        timings[k] = time.perf_counter() - start
+    print(f"update_one: p50 {np.percentile(timings, 50) * 1e6:.2f} us, p99 {np.percentile(timings, 99) * 1e6:.2f} us")
+    print(f"5-step volatility forecast for {online.names[0]}: {np.round(online.forecast(5)[0], 5)}")
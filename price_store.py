@@ -0,0 +1,140 @@
+# Price Store: Columnar (Parquet) storage for fetched stock data, shared by all demos
+
+import os
+import glob
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# One directory per symbol, holding one or more Parquet part files
+STORE_DIR = "/home/ubuntu/price_store"
+LEGACY_CSV = "/home/ubuntu/aapl_stock_data_10y.csv"
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close']
+ROW_GROUP_SIZE = 65536 # Small enough for date predicates to skip whole row groups
+MAX_PARTS = 64 # Appends beyond this many part files trigger a compaction
+
+
+def symbol_dir(symbol, store_dir=STORE_DIR):
+    """ Returns the directory holding the part files of a symbol. """
+    return os.path.join(store_dir, symbol.upper())
+
+
+def list_parts(symbol, store_dir=STORE_DIR):
+    """ Returns the part files of a symbol in write order. """
+    return sorted(glob.glob(os.path.join(symbol_dir(symbol, store_dir), "part-*.parquet")))
+
+
+def _part_path(symbol, number, store_dir=STORE_DIR):
+    return os.path.join(symbol_dir(symbol, store_dir), f"part-{number:05d}.parquet")
+
+
+def _part_number(part):
+    return int(os.path.basename(part)[5:10])
+
+
+def _write_part(df, path):
+    """ Writes df to a temporary file next to path and renames it into place, so a part is never partial. """
+    df = df.copy()
+    df.index.name = 'Date'
+    table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_prices(df, symbol, store_dir=STORE_DIR):
+    """ Replaces the stored history of a symbol with df (indexed by Date).
+
+    The new history is written as the next part before the old parts are removed, so an
+    interrupted write leaves the previous history in place.
+    """
+    path = symbol_dir(symbol, store_dir)
+    os.makedirs(path, exist_ok=True)
+    old_parts = list_parts(symbol, store_dir)
+    number = _part_number(old_parts[-1]) + 1 if old_parts else 0
+    _write_part(df.sort_index(), _part_path(symbol, number, store_dir))
+    for part in old_parts:
+        os.remove(part)
+    return path
+
+
+def append_prices(df, symbol, store_dir=STORE_DIR, compact=True, replace=True):
+    """ Stores df as a new part file after the existing ones.
+
+    With replace=True, stored rows dated at or after df's first row are replaced by df (e.g. a
+    partial last bar fetched mid-session); only the newest parts that hold such rows are read and
+    rewritten. With compact=True, going over MAX_PARTS part files compacts the symbol.
+    Latency-sensitive writers whose rows are known to be newer pass False for both and call
+    compact_prices themselves.
+    """
+    first = df.index.min()
+    for part in reversed(list_parts(symbol, store_dir) if replace else []):
+        if pd.Timestamp(pc.max(pq.read_table(part, columns=['Date'])['Date']).as_py()) < first:
+            break
+        kept = pq.read_table(part).to_pandas().set_index('Date')
+        kept = kept[kept.index < first]
+        if len(kept):
+            _write_part(kept, part)
+        else:
+            os.remove(part)
+    parts = list_parts(symbol, store_dir)
+    if not parts:
+        return write_prices(df, symbol, store_dir)
+    path = symbol_dir(symbol, store_dir)
+    _write_part(df.sort_index(), _part_path(symbol, _part_number(parts[-1]) + 1, store_dir))
+    if compact and len(parts) + 1 > MAX_PARTS:
+        compact_prices(symbol, store_dir)
+    return path
+
+
+def compact_prices(symbol, store_dir=STORE_DIR):
+    """ Rewrites all part files of a symbol into a single one. """
+    return write_prices(load_prices(symbol, store_dir=store_dir), symbol, store_dir)
+
+
+def last_timestamp(symbol, store_dir=STORE_DIR):
+    """ Returns the newest stored Date of a symbol, or None if nothing is stored. """
+    parts = list_parts(symbol, store_dir)
+    if not parts:
+        return None
+    # Parts are appended in date order, so only the newest one needs to be read
+    dates = pq.read_table(parts[-1], columns=['Date'])['Date']
+    return pd.Timestamp(pc.max(dates).as_py())
+
+
+def load_prices(symbol, columns=None, start=None, end=None, store_dir=STORE_DIR):
+    """ Loads stored prices with optional column projection and [start, end] date range. """
+    parts = list_parts(symbol, store_dir)
+    if not parts:
+        raise FileNotFoundError(f"No stored prices for {symbol} in {store_dir}")
+
+    dataset = ds.dataset(parts, format='parquet')
+    # Only the requested columns are decoded; the date filter is pushed down to the row groups
+    columns = ['Date'] + list(columns if columns is not None else PRICE_COLUMNS)
+    predicate = None
+    if start is not None:
+        predicate = ds.field('Date') >= pd.Timestamp(start)
+    if end is not None:
+        upper = ds.field('Date') <= pd.Timestamp(end)
+        predicate = upper if predicate is None else predicate & upper
+
+    df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+    df.set_index('Date', inplace=True)
+    if not df.index.is_monotonic_increasing:
+        df.sort_index(inplace=True)
+    return df
+
+
+if __name__ == "__main__":
+    # Migrate the CSV written by earlier versions of fetch_stock_data.py into the store
+    df = pd.read_csv(LEGACY_CSV, index_col='Date', parse_dates=True)
+    path = write_prices(df, "AAPL")
+    print(f"Stored {len(df)} rows from {LEGACY_CSV} in {path}")
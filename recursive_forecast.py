@@ -0,0 +1,83 @@
+# Recursive Forecast: Multi-step XGBoost forecasts for a panel, feeding each step's predictions back as lags
+
+import numpy as np
+from feature_builder import FEATURE_NAMES
+from feature_stream import FeatureState
+
+
+def booster_and_range(model):
+    """ The Booster behind an XGBRegressor (or a Booster) and the tree range its predict() would use. """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    try:
+        return booster, (0, booster.best_iteration + 1) # Trees up to the early-stopping optimum
+    except AttributeError:
+        return booster, (0, 0) # All trees
+
+
+def recursive_forecast(model, prices, dates, state=None):
+    """ Forecasts of every ticker for each of dates, (tickers, len(dates)), from a (tickers x time) price history.
+
+    All tickers advance together: each step builds the panel's feature rows for the next date in a
+    reused float32 buffer (FeatureState), predicts them in one inplace_predict call, and appends
+    the predictions to the state as if they were observed prices. A FeatureState already holding
+    the history can be passed as state instead of prices; it is advanced in place.
+    """
+    state = state if state is not None else FeatureState.from_history(prices)
+    booster, iteration_range = booster_and_range(model)
+    n = len(state.ring)
+    features = np.empty((n, len(FEATURE_NAMES)), dtype=np.float32)
+    forecasts = np.empty((n, len(dates)))
+    for step, date in enumerate(dates):
+        state.features(date, features)
+        forecasts[:, step] = booster.inplace_predict(features, iteration_range=iteration_range, missing=np.nan)
+        state.append(forecasts[:, step])
+    return forecasts
+
+
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    import xgboost as xgb
+    from feature_builder import build_features
+    from price_store import load_prices
+
+    # The class3_demos.py model, trained on AAPL up to the test year
+    df = load_prices("AAPL", columns=['Adj Close'])
+    ts = df['Adj Close']
+    train_size = len(ts) - 252
+    X = pd.DataFrame(build_features(ts.to_numpy(), ts.index)[0], index=ts.index, columns=list(FEATURE_NAMES))
+    X_train, y_train = X[:train_size].dropna(), ts[:train_size]
+    y_train = y_train.loc[X_train.index]
+    model = xgb.XGBRegressor(objective='reg:squarederror', n_estimators=1000, learning_rate=0.01, max_depth=5,
+                             subsample=0.8, colsample_bytree=0.8, random_state=42, early_stopping_rounds=50, n_jobs=-1)
+    model.fit(X_train[:-252], y_train[:-252], eval_set=[(X_train[-252:], y_train[-252:])], verbose=False)
+
+    # One step from the end of training equals predict() on the true feature row
+    test_dates = ts.index[train_size:]
+    one_step = recursive_forecast(model, ts.to_numpy()[None, :train_size], test_dates[:1])[0, 0]
+    print(f"First step {one_step:.4f} vs predict() {model.predict(X.iloc[[train_size]])[0]:.4f}")
+
+    # Whole test year, recursively, against the actuals and the one-step-ahead predictions
+    multi = recursive_forecast(model, ts.to_numpy()[None, :train_size], test_dates)[0]
+    actual = ts.to_numpy()[train_size:]
+    one_ahead = model.predict(X.iloc[train_size:])
+    print(f"252-step recursive RMSE {np.sqrt(np.mean((multi - actual) ** 2)):.4f}, "
+          f"one-step-ahead RMSE {np.sqrt(np.mean((one_ahead - actual) ** 2)):.4f}")
+
+    # 500 tickers x 21 steps, versus rebuilding features and predicting one ticker and one row at a time
+    rng = np.random.default_rng(0)
+    panel = ts.to_numpy()[:train_size] * np.exp(rng.normal(0, 0.01, (500, train_size)).cumsum(axis=1) * 0.1)
+    start = time.perf_counter()
+    batched = recursive_forecast(model, panel, test_dates[:21])
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(5):
+        history = pd.Series(panel[i], index=ts.index[:train_size])
+        for step, date in enumerate(test_dates[:21]):
+            extended = pd.concat([history, pd.Series([np.nan], index=[date])])
+            row = build_features(extended.to_numpy(), extended.index)[0][-1:]
+            history = pd.concat([history, pd.Series(model.predict(row), index=[date])])
+        assert np.isclose(history.iloc[-1], batched[i, -1], rtol=1e-6)
+    looped = (time.perf_counter() - start) / 5 * len(panel)
+    print(f"500 tickers x 21 steps: {elapsed:.2f}s batched vs ~{looped:.1f}s row by row ({looped / elapsed:.0f}x)")
@@ -0,0 +1,165 @@
+# Render Pipeline: Headless, parallel rendering of figure specs with the object-oriented Agg API
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from downsample import minmax_decimate, envelope_decimate, lttb
+
+OUTPUT_DIR = "/home/ubuntu"
+
+
+def line(series, y=None, fmt=None, **style):
+    """ Line spec from a pandas Series (x = index), a bare array (x = position) or explicit x and y.
+    style goes to ax.plot.
+    """
+    if y is not None:
+        x = series
+    elif hasattr(series, 'index'):
+        x, y = series.index.to_numpy(), series.to_numpy()
+    else:
+        x, y = np.arange(len(series)), series
+    return {'x': np.asarray(x), 'y': np.asarray(y, dtype=np.float64), 'fmt': fmt, 'style': style}
+
+
+def band(x, lower, upper, **style):
+    """ Shaded band spec (ax.fill_between), e.g. a forecast interval. """
+    return {'x': np.asarray(x), 'lower': np.asarray(lower, dtype=np.float64),
+            'upper': np.asarray(upper, dtype=np.float64), 'style': style}
+
+
+def panel(lines=(), title=None, xlabel=None, ylabel=None, legend=None, grid=False, bands=()):
+    """ One set of axes. legend is None for no legend, True for the default location, or a loc string. """
+    return {'lines': list(lines), 'bands': list(bands), 'title': title, 'xlabel': xlabel,
+            'ylabel': ylabel, 'legend': legend, 'grid': grid}
+
+
+def _markers_only(spec):
+    fmt, style = spec['fmt'] or '', spec['style']
+    if style.get('linestyle', style.get('ls')) in ('None', 'none', '', ' '):
+        return True
+    return bool(fmt) and not any(c in fmt for c in '-:')
+
+
+def decimate_panel(spec, n_buckets):
+    """ Reduces every line and band of a panel to about one bucket per pixel column (see downsample.py).
+
+    Lines keep the min/max of each bucket, so they cover the same pixels; marker-only series use LTTB
+    with the same point budget (four per bucket).
+    """
+    for ln in spec['lines']:
+        if _markers_only(ln):
+            ln['x'], ln['y'] = lttb(ln['x'], ln['y'], 4 * n_buckets)
+        else:
+            ln['x'], ln['y'] = minmax_decimate(ln['x'], ln['y'], n_buckets)
+    for b in spec['bands']:
+        b['x'], b['lower'], b['upper'] = envelope_decimate(b['x'], b['lower'], b['upper'], n_buckets)
+    return spec
+
+
+def figure_spec(filename, panels=(), figsize=(12, 6), suptitle=None, tight=False, correlogram=None,
+                titles=None, decimate=True, output_dir=OUTPUT_DIR):
+    """ Pure-data description of one figure: panels stacked vertically, or an ACF/PACF pair when a
+    Correlogram (see correlogram.py) is given. Specs are plain picklable data, so computing them and
+    drawing them can happen in different processes.
+
+    With decimate=True long series are reduced to the figure's pixel width here, so neither the
+    transfer to the render workers nor the drawing grows with the series length.
+    """
+    panels = list(panels)
+    if decimate:
+        n_buckets = int(figsize[0] * rcParams['figure.dpi'])
+        panels = [decimate_panel(p, n_buckets) for p in panels]
+    return {'path': os.path.join(output_dir, filename), 'panels': panels, 'figsize': figsize,
+            'suptitle': suptitle, 'tight': tight, 'correlogram': correlogram, 'titles': titles}
+
+
+def _draw_panel(ax, spec):
+    for b in spec['bands']:
+        ax.fill_between(b['x'], b['lower'], b['upper'], **b['style'])
+    for ln in spec['lines']:
+        args = (ln['x'], ln['y']) + ((ln['fmt'],) if ln['fmt'] else ())
+        ax.plot(*args, **ln['style'])
+    if spec['title']:
+        ax.set_title(spec['title'])
+    if spec['xlabel']:
+        ax.set_xlabel(spec['xlabel'])
+    if spec['ylabel']:
+        ax.set_ylabel(spec['ylabel'])
+    if spec['legend'] is not None:
+        ax.legend(**({} if spec['legend'] is True else {'loc': spec['legend']}))
+    if spec['grid']:
+        ax.grid(True)
+
+
+def render(spec):
+    """ Draws one figure spec to its PNG path without touching pyplot state; returns the path. """
+    fig = Figure(figsize=spec['figsize'])
+    FigureCanvasAgg(fig)
+    if spec['correlogram'] is not None:
+        from correlogram import plot_correlogram
+        axes = fig.subplots(1, 2)
+        plot_correlogram(spec['correlogram'], axes, **({'titles': spec['titles']} if spec['titles'] else {}))
+    else:
+        axes = np.atleast_1d(fig.subplots(len(spec['panels']), 1))
+        for ax, panel_spec in zip(axes, spec['panels']):
+            _draw_panel(ax, panel_spec)
+    if spec['tight']:
+        fig.tight_layout()
+    if spec['suptitle']:
+        fig.suptitle(spec['suptitle'], y=1.02)
+    fig.savefig(spec['path'])
+    return spec['path']
+
+
+def render_all(specs, max_workers=None):
+    """ Renders figure specs in a process pool (in-process when max_workers=1); returns the paths in order.
+
+    Falls back to rendering in-process when the pool cannot start or its workers die, e.g. on
+    platforms without process semaphores or when the caller's module is not import-safe.
+    """
+    specs = list(specs)
+    workers = min(max_workers or os.cpu_count(), len(specs))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(render, specs, chunksize=max(1, len(specs) // (4 * workers))))
+        except (BrokenProcessPool, OSError, NotImplementedError):
+            pass
+    return [render(spec) for spec in specs]
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    import pandas as pd
+    from price_store import load_prices
+    from rolling_engine import rolling_mean_std
+
+    # 500-ticker report: price with 50/200-day moving averages for each ticker (plot_02 layout)
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    rng = np.random.default_rng(0)
+    panel_values = ts.to_numpy() * np.exp(rng.normal(0, 0.01, (500, len(ts))).cumsum(axis=1) * 0.1)
+    stats = rolling_mean_std(panel_values.T, windows=(50, 200)) # The rolling engine is (time x series)
+    out = tempfile.mkdtemp()
+    specs = []
+    for i, values in enumerate(panel_values):
+        series = pd.Series(values, index=ts.index)
+        specs.append(figure_spec(f"ticker_{i:03d}.png", [panel(
+            [line(series, label='Adj Close'),
+             line(ts.index, stats[50][0][:, i], label='50-Day SMA', color='orange'),
+             line(ts.index, stats[200][0][:, i], label='200-Day SMA', color='red')],
+            title=f'Ticker {i:03d} Adj Close with 50 & 200 Day Moving Averages',
+            xlabel='Date', ylabel='Price (USD)', legend=True, grid=True)], output_dir=out))
+
+    start = time.perf_counter()
+    render_all(specs[:50], max_workers=1)
+    serial = (time.perf_counter() - start) / 50 * len(specs)
+    start = time.perf_counter()
+    render_all(specs)
+    pooled = time.perf_counter() - start
+    print(f"{len(specs)} figures on {os.cpu_count()} cores: {pooled:.1f}s in the process pool, "
+          f"{serial:.1f}s estimated serially ({serial / pooled:.1f}x)")
@@ -0,0 +1,156 @@
+# Rolling Engine: O(1) per-bar rolling mean and standard deviation for a panel of series
+
+import numpy as np
+
+DEFAULT_WINDOWS = (50, 200, 252) # SMA windows from Class 1 and the 252-day rolling statistics
+
+
+class RollingStats:
+    """ Incremental rolling mean/std over several windows for n_series series updated together.
+
+    One ring buffer (sized for the longest window) holds the recent values; each window keeps a
+    running mean and sum of squared deviations (sliding Welford update), so an update costs O(1)
+    per series and window. The running sums are recomputed from the buffer every resync updates
+    to stop rounding drift from accumulating. NaN bars are kept out of the running sums; as in
+    pandas, a window's statistics are NaN while it holds a NaN.
+    """
+
+    def __init__(self, n_series=1, windows=DEFAULT_WINDOWS, ddof=1, resync=4096):
+        self.n_series = n_series
+        self.windows = tuple(windows)
+        self.ddof = ddof
+        self.resync = resync
+        self.size = max(self.windows)
+        self.buffer = np.zeros((self.size, n_series))
+        self.means = {w: np.zeros(n_series) for w in self.windows}
+        self.m2 = {w: np.zeros(n_series) for w in self.windows}
+        self.valid = {w: np.zeros(n_series) for w in self.windows} # Finite values in each window
+        self.count = 0
+        self.buffer_nans = 0 # NaN values held in the buffer; zero selects the fast update
+
+    def update(self, values):
+        """ Adds one bar per series (array of length n_series). """
+        x = np.asarray(values, dtype=np.float64).reshape(self.n_series)
+        total = x.sum() # NaN if any value is; cheaper than counting on every bar
+        x_nans = int(np.isnan(x).sum()) if total != total else 0
+        if x_nans or self.buffer_nans:
+            self._update_with_gaps(x)
+        else:
+            for w in self.windows:
+                mean = self.means[w]
+                if self.count >= w:
+                    # Slide: replace the value leaving the window with the new one
+                    old = self.buffer[(self.count - w) % self.size]
+                    new_mean = mean + (x - old) / w
+                    self.m2[w] += (x - old) * (x - new_mean + old - mean)
+                    self.means[w] = new_mean
+                else:
+                    # Still filling the window: plain Welford step
+                    delta = x - mean
+                    mean = mean + delta / (self.count + 1)
+                    self.m2[w] += delta * (x - mean)
+                    self.means[w] = mean
+                    self.valid[w] += 1
+        slot = self.count % self.size
+        if self.buffer_nans:
+            self.buffer_nans -= int(np.isnan(self.buffer[slot]).sum())
+        self.buffer[slot] = x
+        self.buffer_nans += x_nans
+        self.count += 1
+        if self.count % self.resync == 0:
+            self._resync()
+
+    def _update_with_gaps(self, x):
+        """ update() when a NaN enters or is inside a window: only finite values enter the running sums. """
+        entering = ~np.isnan(x)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for w in self.windows:
+                mean, m2, k = self.means[w], self.m2[w], self.valid[w]
+                old = self.buffer[(self.count - w) % self.size] if self.count >= w else np.full(self.n_series, np.nan)
+                leaving = ~np.isnan(old)
+                # Both finite: slide as usual; otherwise remove the old value or add the new one (Welford steps)
+                new_mean = mean + (x - old) / k
+                replaced = m2 + (x - old) * (x - new_mean + old - mean)
+                removed_mean = np.where(k > 1, mean - (old - mean) / (k - 1), 0.0)
+                removed = np.where(k > 1, m2 - (old - mean) * (old - removed_mean), 0.0)
+                delta = x - mean
+                added_mean = mean + delta / (k + 1)
+                added = m2 + delta * (x - added_mean)
+                both, only_old, only_new = leaving & entering, leaving & ~entering, ~leaving & entering
+                self.means[w] = np.select([both, only_old, only_new], [new_mean, removed_mean, added_mean], mean)
+                self.m2[w] = np.select([both, only_old, only_new], [replaced, removed, added], m2)
+                self.valid[w] = k + entering - leaving
+
+    def _resync(self):
+        for w in self.windows:
+            n = min(self.count, w)
+            recent = self.buffer[np.arange(self.count - n, self.count) % self.size]
+            finite = ~np.isnan(recent)
+            self.valid[w] = finite.sum(axis=0).astype(np.float64)
+            self.means[w] = np.where(finite, recent, 0.0).sum(axis=0) / np.maximum(self.valid[w], 1)
+            self.m2[w] = np.where(finite, (recent - self.means[w]) ** 2, 0.0).sum(axis=0)
+
+    def mean(self, window):
+        """ Rolling mean per series, NaN until the window has filled and while it holds a NaN. """
+        return np.where(self.valid[window] < window, np.nan, self.means[window])
+
+    def std(self, window):
+        """ Rolling standard deviation per series, NaN until the window has filled and while it holds a NaN. """
+        if window <= self.ddof:
+            return np.full(self.n_series, np.nan)
+        std = np.sqrt(np.maximum(self.m2[window], 0.0) / (window - self.ddof))
+        return np.where(self.valid[window] < window, np.nan, std)
+
+
+def rolling_mean_std(values, windows=DEFAULT_WINDOWS, ddof=1):
+    """ Batch mode: runs a (time,) or (time, series) array through the engine.
+
+    Returns {window: (means, stds)} with arrays shaped like values, matching
+    pandas .rolling(window).mean() / .std() (NaN before each window fills and while it holds a NaN).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    panel = values.reshape(len(values), -1)
+    engine = RollingStats(panel.shape[1], windows, ddof)
+    out = {w: (np.empty_like(panel), np.empty_like(panel)) for w in windows}
+    for t in range(len(panel)):
+        engine.update(panel[t])
+        for w in windows:
+            out[w][0][t] = engine.mean(w)
+            out[w][1][t] = engine.std(w)
+    return {w: (means.reshape(values.shape), stds.reshape(values.shape)) for w, (means, stds) in out.items()}
+
+
+if __name__ == "__main__":
+    import time
+    from price_store import load_prices
+
+    # Check the batch mode against pandas on the stored AAPL history
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    results = rolling_mean_std(ts.to_numpy())
+    for w, (means, stds) in results.items():
+        expected_mean = ts.rolling(window=w).mean().to_numpy()
+        expected_std = ts.rolling(window=w).std().to_numpy()
+        assert np.allclose(means, expected_mean, rtol=1e-10, equal_nan=True)
+        assert np.allclose(stds, expected_std, rtol=1e-8, equal_nan=True)
+        print(f"Window {w}: max |mean diff| {np.nanmax(np.abs(means - expected_mean)):.2e}, "
+              f"max |std diff| {np.nanmax(np.abs(stds - expected_std)):.2e}")
+
+    # Gaps: NaN only while a NaN is inside the window, as in pandas
+    gappy = ts.copy()
+    gappy.iloc[[10, 300, 301, 1500]] = np.nan
+    engine_results = {w: rolling_mean_std(gappy.to_numpy(), windows=(w,))[w] for w in (3, 50)}
+    for w, (means, stds) in engine_results.items():
+        assert np.allclose(means, gappy.rolling(window=w).mean().to_numpy(), rtol=1e-10, equal_nan=True)
+        assert np.allclose(stds, gappy.rolling(window=w).std().to_numpy(), rtol=1e-8, equal_nan=True)
+    print(f"With gaps: matches pandas for windows {sorted(engine_results)}")
+
+    # Per-bar update cost for a universe of tickers
+    n_series = 5000
+    engine = RollingStats(n_series)
+    panel = 100 + np.random.default_rng(0).standard_normal((600, n_series)).cumsum(axis=0)
+    start = time.perf_counter()
+    for row in panel:
+        engine.update(row)
+    elapsed = time.perf_counter() - start
+    print(f"{n_series} series: {elapsed / len(panel) * 1e3:.3f} ms per bar for all series "
+          f"({elapsed / len(panel) / n_series * 1e9:.0f} ns per series)")
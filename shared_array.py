@@ -0,0 +1,32 @@
+# Shared Array: Hands a numpy array to process-pool workers once through shared memory
+
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+_attached = {}
+
+
+def attach(name, shape, dtype):
+    """ Pool initializer: maps the shared array once per worker process. """
+    shm = SharedMemory(name=name)
+    _attached['shm'] = shm
+    _attached['array'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def shared_array():
+    """ The array mapped by attach() in this worker. """
+    return _attached['array']
+
+
+@contextmanager
+def shared_copy(array):
+    """ Copies array into a new shared memory block and yields the initargs for attach();
+    the block is freed on exit. """
+    shm = SharedMemory(create=True, size=array.nbytes)
+    try:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+        yield shm.name, array.shape, array.dtype
+    finally:
+        shm.close()
+        shm.unlink()
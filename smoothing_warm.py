@@ -0,0 +1,147 @@
+# Smoothing Warm: Persisted Holt / Holt-Winters state, refreshed on new bars instead of refitting
+
+import numpy as np
+from smoothing_panel import PARAM_NAMES, BOUNDS, fit_panel, initial_states, smooth
+
+
+class WarmSmoother:
+    """ Fitted smoothing parameters and states for a panel of series, updated bar by bar.
+
+    Besides the final level/trend/season it keeps the last `window` observations and the states at
+    the start of that window, so parameters can be re-optimized on recent data from the previous
+    optimum without rerunning the recursion over the whole history.
+    """
+
+    def __init__(self, model, seasonal_periods, params, fixed, window, start_states, states):
+        self.model = model
+        self.seasonal_periods = seasonal_periods
+        self.params = params # (n, k) in PARAM_NAMES order
+        self.fixed = fixed # (k,) True where a parameter was fixed by the caller
+        self.window = window # (n, L) most recent observations
+        self.start_states = start_states # (level, trend, season) before window[:, 0]
+        self.states = states # (level, trend, season) after window[:, -1]
+
+    @classmethod
+    def fit(cls, panel, model='holt', seasonal_periods=None, window=None, **fit_kwargs):
+        """ Full fit of a (series x time) panel, keeping the last `window` bars for later re-optimization. """
+        panel = np.atleast_2d(np.asarray(panel, dtype=np.float64))
+        names = PARAM_NAMES[model]
+        fixed = np.array([name in fit_kwargs for name in names])
+        result = fit_panel(panel, model, seasonal_periods, **fit_kwargs)
+        params = np.stack([result.params[name] for name in names], axis=1)
+
+        window = window or (2 * seasonal_periods if model == 'hw' else 252)
+        window = min(window, panel.shape[1] - 1)
+        head = panel[:, :-window]
+        _, start_states, _ = smooth(head, model, cls._columns(params), initial_states(panel, model, seasonal_periods))
+        return cls(model, seasonal_periods, params, fixed, panel[:, -window:].copy(),
+                   cls._best(start_states, 0), (result.level, result.trend, result.season))
+
+    @staticmethod
+    def _columns(params):
+        return [params[:, j:j + 1] for j in range(params.shape[1])]
+
+    @staticmethod
+    def _best(states, best):
+        """ Picks one candidate per series out of states returned by smooth(). """
+        level, trend, season = states
+        rows = np.arange(level.shape[0])
+        best = np.broadcast_to(best, rows.shape)
+        return (level[rows, best],
+                trend[rows, best] if trend is not None else None,
+                season[rows, best] if season is not None else None)
+
+    def update(self, new_values, reoptimize=True, rounds=3, step=0.02):
+        """ Consumes new bars (n,) or (n, k) and returns the updated one-step-ahead forecasts.
+
+        The recursion runs forward from the saved states. With reoptimize=True the parameters are
+        then refined on the recent window by a local search around their previous values.
+        """
+        new_values = np.asarray(new_values, dtype=np.float64).reshape(self.window.shape[0], -1)
+        k = new_values.shape[1]
+
+        # Slide the window: the bars leaving it move the window-start states forward
+        dropped = self.window[:, :k]
+        _, start_states, _ = smooth(dropped, self.model, self._columns(self.params), self.start_states)
+        self.start_states = self._best(start_states, 0)
+        self.window = np.concatenate([self.window[:, k:], new_values], axis=1)
+
+        if not reoptimize or self.fixed.all():
+            _, states, _ = smooth(new_values, self.model, self._columns(self.params), self.states)
+            self.states = self._best(states, 0)
+            return self.forecast(1)[:, 0]
+
+        # Local pattern search: try +/- step on every free parameter at once, keep the best, halve the step
+        free = np.flatnonzero(~self.fixed)
+        offsets = np.stack(np.meshgrid(*[[-1, 0, 1]] * len(free), indexing='ij'), axis=-1).reshape(-1, len(free))
+        for _ in range(rounds):
+            candidates = np.repeat(self.params[:, None, :], len(offsets), axis=1) # (n, G, k)
+            candidates[:, :, free] = np.clip(candidates[:, :, free] + step * offsets[None], *BOUNDS)
+            sse, states, _ = smooth(self.window, self.model,
+                                    [candidates[:, :, j] for j in range(candidates.shape[2])], self.start_states)
+            best = np.argmin(sse, axis=1)
+            self.params = candidates[np.arange(len(best)), best]
+            step /= 2
+        self.states = self._best(states, best)
+        return self.forecast(1)[:, 0]
+
+    def forecast(self, steps):
+        """ Forecasts for the next `steps` bars, shaped (n, steps). """
+        level, trend, season = self.states
+        h = np.arange(1, steps + 1)
+        if self.model == 'ses':
+            return np.repeat(level[:, None], steps, axis=1)
+        path = level[:, None] + h[None, :] * trend[:, None]
+        if self.model == 'hw':
+            path = path * season[:, (h - 1) % self.seasonal_periods]
+        return path
+
+    def save(self, path):
+        level, trend, season = self.states
+        start_level, start_trend, start_season = self.start_states
+        optional = {}
+        for name, value in [('trend', trend), ('season', season), ('start_trend', start_trend), ('start_season', start_season)]:
+            if value is not None:
+                optional[name] = value
+        np.savez(path, model=self.model, seasonal_periods=self.seasonal_periods or 0, params=self.params,
+                 fixed=self.fixed, window=self.window, level=level, start_level=start_level, **optional)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            get = lambda name: data[name] if name in data.files else None
+            return cls(str(data['model']), int(data['seasonal_periods']) or None, data['params'], data['fixed'],
+                       data['window'], (data['start_level'], get('start_trend'), get('start_season')),
+                       (data['level'], get('trend'), get('season')))
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+    from price_store import load_prices
+
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close'].to_numpy()
+    rng = np.random.default_rng(0)
+    panel = ts * np.exp(rng.normal(0, 0.01, (64, len(ts))).cumsum(axis=1) * 0.1)
+
+    for model, kwargs in [('holt', {}), ('hw', {'seasonal_periods': 252})]:
+        start = time.perf_counter()
+        smoother = WarmSmoother.fit(panel[:, :-1], model, **kwargs)
+        full = time.perf_counter() - start
+
+        path = os.path.join(tempfile.mkdtemp(), f"{model}_state.npz")
+        smoother.save(path)
+        start = time.perf_counter()
+        smoother = WarmSmoother.load(path)
+        smoother.update(panel[:, -1])
+        warm = time.perf_counter() - start
+
+        # Compare the next-bar forecast against a full refit on the same data
+        refit = fit_panel(panel, model, **kwargs)
+        refit_forecast = refit.level + refit.trend
+        if model == 'hw':
+            refit_forecast = refit_forecast * refit.season[:, 0]
+        gap = np.abs(smoother.forecast(1)[:, 0] / refit_forecast - 1)
+        print(f"{model}: full fit {full / len(panel) * 1e3:.1f} ms/series, warm update {warm / len(panel) * 1e3:.2f} ms/series; "
+              f"median gap to a full refit's next-bar forecast {np.median(gap):.3%}")
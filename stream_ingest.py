@@ -0,0 +1,191 @@
+# Stream Ingest: Micro-batched intraday bar ingestion with a live window for rolling stats and GARCH
+
+import argparse
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from arch import arch_model
+from chart_stub_server import make_chart_response, INTERVAL_SECONDS
+from fetch_stock_data import chart_to_dataframe
+from online_garch import OnlineGarch
+from price_store import write_prices, append_prices, compact_prices, load_prices, PRICE_COLUMNS, STORE_DIR
+from rolling_engine import RollingStats
+
+
+def store_key(symbol, interval):
+    """ Intraday bars are stored apart from the daily history of the same symbol. """
+    return symbol if interval == "1d" else f"{symbol}_{interval}"
+
+
+def bar_feed(symbol="AAPL", interval="1m", start=None, n_bars=1000, pace=0.0):
+    """ Local stand-in for a live feed: yields (Date, bar dict) pairs, sleeping pace seconds between bars. """
+    start = int(start if start is not None else time.time() - 5 * 86400)
+    # Sessions are 6.5 hours on weekdays; ask for enough calendar days to cover n_bars
+    bars_per_day = max(1, 23400 // INTERVAL_SECONDS[interval])
+    days = int(n_bars / bars_per_day * 7 / 5) + 4
+    payload = make_chart_response(symbol, interval=interval, period1=start, period2=start + days * 86400)
+    df = chart_to_dataframe(payload).iloc[:n_bars]
+    for date, values in zip(df.index, df[PRICE_COLUMNS].to_numpy()):
+        if pace:
+            time.sleep(pace)
+        yield date, dict(zip(PRICE_COLUMNS, values))
+
+
+class LiveWindow:
+    """ Ring buffer of the latest bars, kept in memory so consumers never reload from the store. """
+
+    def __init__(self, size, columns=PRICE_COLUMNS):
+        self.size = size
+        self.columns = list(columns)
+        self.dates = np.empty(size, dtype='datetime64[ns]')
+        self.values = np.empty((size, len(self.columns)), dtype=np.float64)
+        self.count = 0 # Total bars seen; the newest bar sits at (count - 1) % size
+
+    def extend(self, df):
+        for date, row in zip(df.index.to_numpy(), df[self.columns].to_numpy()):
+            slot = self.count % self.size
+            self.dates[slot] = date
+            self.values[slot] = row
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def _order(self):
+        return np.arange(self.count - len(self), self.count) % self.size
+
+    def column(self, name='Adj Close'):
+        """ Returns the window of one column in time order. """
+        return self.values[self._order(), self.columns.index(name)]
+
+    def series(self, name='Adj Close'):
+        """ Returns the window of one column as a Date-indexed Series. """
+        order = self._order()
+        return pd.Series(self.values[order, self.columns.index(name)], index=pd.DatetimeIndex(self.dates[order]), name=name)
+
+
+class GarchTracker:
+    """ Conditional volatility of one symbol's log returns under fixed GARCH(1,1) parameters, updated per bar. """
+
+    def __init__(self, garch, last_price):
+        self.garch = garch # Single-ticker OnlineGarch (see online_garch.py), in unscaled returns
+        self.last_price = last_price
+
+    @property
+    def alpha(self):
+        return self.garch.alpha.item(0)
+
+    @property
+    def beta(self):
+        return self.garch.beta.item(0)
+
+    @classmethod
+    def fit(cls, prices, scale=100.0):
+        """ Fits GARCH(1,1) on the log returns of a price history (scaled, percent by default, for the optimizer). """
+        returns = np.log(prices[1:] / prices[:-1]) * scale
+        fit = arch_model(returns, vol='Garch', p=1, q=1, rescale=False).fit(disp='off')
+        return cls(OnlineGarch.from_arch([fit], scale=scale), prices[-1])
+
+    def update(self, prices):
+        """ Consumes new prices and returns the next-bar volatility forecast. """
+        for price in prices:
+            self.garch.update_one(0, np.log(price / self.last_price))
+            self.last_price = price
+        return self.garch.volatility().item(0)
+
+
+def ingest(feed, symbol, interval="1m", batch_size=32, max_delay=0.2, window=None, store_dir=STORE_DIR):
+    """ Consumes a bar feed in micro-batches, appending each one to the store.
+
+    A batch is flushed when it holds batch_size bars or its oldest bar has waited max_delay seconds.
+    Yields (batch DataFrame, arrival times of its bars, live window) after each flush. If the feed
+    raises, the bars already received are flushed and the error is re-raised here. Flushes never
+    compact the store (that rewrites the whole history); the key is compacted once the feed ends.
+    """
+    window = window if window is not None else LiveWindow(512)
+    key = store_key(symbol, interval)
+    bars = queue.Queue()
+
+    def produce():
+        end = None # Sentinel; the feed's exception if it fails
+        try:
+            for date, bar in feed:
+                bars.put((time.perf_counter(), date, bar))
+        except BaseException as e:
+            end = e
+        finally:
+            bars.put(end)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    pending, done, failure = [], False, None
+    while not done:
+        timeout = None if not pending else max(0.0, pending[0][0] + max_delay - time.perf_counter())
+        try:
+            item = bars.get(timeout=timeout)
+            if item is None or isinstance(item, BaseException):
+                done, failure = True, item
+            else:
+                pending.append(item)
+        except queue.Empty:
+            pass
+
+        due = pending and (len(pending) >= batch_size or done
+                           or time.perf_counter() - pending[0][0] >= max_delay)
+        if due:
+            arrivals = np.array([item[0] for item in pending])
+            batch = pd.DataFrame([item[2] for item in pending],
+                                 index=pd.DatetimeIndex([item[1] for item in pending], name='Date'))
+            pending = []
+            append_prices(batch, key, store_dir, compact=False, replace=False) # Bars arrive in order
+            window.extend(batch)
+            yield batch, arrivals, window
+    compact_prices(key, store_dir)
+    if failure is not None:
+        raise failure
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream intraday bars from a local stand-in feed into the store.")
+    parser.add_argument('--symbol', default="AAPL")
+    parser.add_argument('--interval', default="1m")
+    parser.add_argument('--bars', type=int, default=2000)
+    parser.add_argument('--pace', type=float, default=0.002, help="Seconds between bars from the feed")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-delay', type=float, default=0.2)
+    parser.add_argument('--store-dir', default=STORE_DIR)
+    args = parser.parse_args()
+
+    # Seed the store with a month of history, then stream the following bars
+    now = int(time.time())
+    history_start, live_start = now - 40 * 86400, now - 10 * 86400
+    payload = make_chart_response(args.symbol, interval=args.interval, period1=history_start, period2=live_start)
+    write_prices(chart_to_dataframe(payload), store_key(args.symbol, args.interval), args.store_dir)
+
+    history = load_prices(store_key(args.symbol, args.interval), columns=PRICE_COLUMNS, store_dir=args.store_dir)
+    window = LiveWindow(512)
+    window.extend(history.iloc[-512:])
+    garch = GarchTracker.fit(history['Adj Close'].to_numpy())
+    rolling = RollingStats(windows=(252,))
+    for price in window.column('Adj Close')[-252:]:
+        rolling.update(price)
+    print(f"Seeded {len(history)} bars; GARCH(1,1) alpha={garch.alpha:.3f} beta={garch.beta:.3f}")
+
+    latencies = []
+    feed = bar_feed(args.symbol, args.interval, start=live_start, n_bars=args.bars, pace=args.pace)
+    for batch, arrivals, window in ingest(feed, args.symbol, args.interval, args.batch_size, args.max_delay,
+                                          window, args.store_dir):
+        # Class 1 rolling statistics and Class 2 GARCH volatility, updated bar by bar
+        for price in batch['Adj Close'].to_numpy():
+            rolling.update(price)
+        rolling_mean, rolling_std = rolling.mean(252)[0], rolling.std(252)[0]
+        volatility = garch.update(batch['Adj Close'].to_numpy())
+        latencies.extend(time.perf_counter() - arrivals)
+
+    latencies = np.array(latencies) * 1e3
+    print(f"Last bar {batch.index[-1]}: rolling mean {rolling_mean:.2f}, rolling std {rolling_std:.3f}, "
+          f"next-bar volatility {volatility:.5f}")
+    print(f"Ingested {len(latencies)} bars; arrival-to-volatility latency "
+          f"p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms, max {latencies.max():.1f} ms")
@@ -0,0 +1,106 @@
+# XGB Export: Compact on-disk format for a trained XGBoost forecaster and the feature spec it was trained on
+
+import hashlib
+import json
+import os
+import tempfile
+from importlib.metadata import version
+import numpy as np
+import xgboost as xgb
+from feature_builder import FEATURE_NAMES, LAGS, WINDOWS
+from recursive_forecast import booster_and_range
+
+MODEL_DIR = "/home/ubuntu/xgb_model"
+MODEL_FILE = "model.ubj" # XGBoost's native Universal Binary JSON
+SPEC_FILE = "spec.json"
+
+
+def export_model(model, model_dir=MODEL_DIR, feature_names=FEATURE_NAMES):
+    """ Writes the model as UBJ plus a JSON spec of the input it expects; returns the spec.
+
+    Trees past the early-stopping optimum are dropped, since predict() never uses them. The spec
+    records the feature columns in order (float32, NaN for missing), the lags and rolling windows
+    behind them, and the model's SHA-256 so a loader can tell a mismatched pair. Files are written
+    to temporaries and renamed into place.
+    """
+    booster, (_, stop) = booster_and_range(model)
+    if 0 < stop < booster.num_boosted_rounds():
+        booster = booster[:stop]
+    raw = booster.save_raw(raw_format='ubj')
+    spec = {
+        'features': list(feature_names),
+        'dtype': 'float32',
+        'missing': 'nan',
+        'lags': list(LAGS),
+        'rolling_windows': list(WINDOWS),
+        'trees': booster.num_boosted_rounds(),
+        'xgboost_version': version('xgboost'),
+        'model_sha256': hashlib.sha256(raw).hexdigest(),
+        'model_bytes': len(raw),
+    }
+    os.makedirs(model_dir, exist_ok=True)
+    for name, payload in ((MODEL_FILE, bytes(raw)), (SPEC_FILE, json.dumps(spec, indent=2).encode())):
+        fd, tmp_path = tempfile.mkstemp(dir=model_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, os.path.join(model_dir, name))
+    return spec
+
+
+def load_model(model_dir=MODEL_DIR, verify=True):
+    """ Reads the exported model once, checks it against the spec and loads it; returns (Booster, spec).
+
+    XGBoost parses the bytes into its own tree structures and cannot predict from a mapped
+    buffer, so the file is simply read; the UBJ format is what keeps this fast.
+    """
+    with open(os.path.join(model_dir, SPEC_FILE)) as f:
+        spec = json.load(f)
+    with open(os.path.join(model_dir, MODEL_FILE), 'rb') as f:
+        raw = f.read()
+    if verify and hashlib.sha256(raw).hexdigest() != spec['model_sha256']:
+        raise ValueError(f"{MODEL_FILE} in {model_dir} does not match its spec")
+    booster = xgb.Booster()
+    booster.load_model(bytearray(raw))
+    booster.set_param({'nthread': 1}) # Requests are small; concurrency comes from serving threads
+    return booster, spec
+
+
+def train_demo_model(ts, train_size):
+    """ The class3_demos.py XGBRegressor on one price series (validation on the last 252 training rows). """
+    import pandas as pd
+    from feature_builder import build_features
+    X = pd.DataFrame(build_features(ts.to_numpy(), ts.index)[0], index=ts.index, columns=list(FEATURE_NAMES))
+    X_train = X[:train_size].dropna()
+    y_train = ts.loc[X_train.index]
+    model = xgb.XGBRegressor(objective='reg:squarederror', n_estimators=1000, learning_rate=0.01, max_depth=5,
+                             subsample=0.8, colsample_bytree=0.8, random_state=42, early_stopping_rounds=50, n_jobs=-1)
+    model.fit(X_train[:-252], y_train[:-252], eval_set=[(X_train[-252:], y_train[-252:])], verbose=False)
+    return model, X
+
+
+def predict(booster, spec, rows):
+    """ Predictions for (n, len(spec['features'])) rows. """
+    rows = np.asarray(rows, dtype=np.float32).reshape(-1, len(spec['features']))
+    return booster.inplace_predict(rows, missing=np.nan)
+
+
+if __name__ == "__main__":
+    import time
+    from price_store import load_prices
+
+    # Train the class3_demos.py model and export it
+    ts = load_prices("AAPL", columns=['Adj Close'])['Adj Close']
+    train_size = len(ts) - 252
+    model, X = train_demo_model(ts, train_size)
+
+    model_dir = tempfile.mkdtemp()
+    spec = export_model(model, model_dir)
+    json_size = len(model.get_booster().save_raw(raw_format='json'))
+    print(f"Exported {spec['trees']} trees: {spec['model_bytes'] / 1024:.0f} KB UBJ "
+          f"(all {model.get_booster().num_boosted_rounds()} trees as JSON: {json_size / 1024:.0f} KB)")
+
+    start = time.perf_counter()
+    booster, spec = load_model(model_dir)
+    loaded = time.perf_counter() - start
+    gap = np.abs(predict(booster, spec, X.iloc[train_size:].to_numpy()) - model.predict(X.iloc[train_size:])).max()
+    print(f"Loaded in {loaded * 1e3:.1f} ms; max |diff| vs the in-process model {gap:.1e}")